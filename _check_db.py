@@ -1,17 +1,15 @@
-import sqlite3
+from database import get_columns, get_read_connection
 
-conn = sqlite3.connect("housing_bot.db")
-c = conn.cursor()
+# Same path and pragmas as the bot, opened query_only
+conn = get_read_connection()
 
 # Get column names
-c.execute("PRAGMA table_info(listings)")
-columns = [col[1] for col in c.fetchall()]
+columns = get_columns("listings")
 print("Columns:", columns)
 print("-" * 120)
 
-# Show top 10 records
-c.execute("SELECT * FROM listings LIMIT 10")
-rows = c.fetchall()
+# Show top 10 records (stream rows straight off the cursor)
+rows = conn.execute("SELECT * FROM listings LIMIT 10")
 for i, row in enumerate(rows, 1):
     print(f"\n--- Record {i} ---")
     for col, val in zip(columns, row):
@@ -1,13 +1,30 @@
-from database import get_connection
-conn = get_connection()
-cursor = conn.cursor()
+from database import get_read_connection
+
+
+def fetch_recent_listings(conn, before=None, limit=5):
+    """
+    Keyset-paginate listings newest-first.
+    `before` is the (created_at, id) of the last row already shown, or None
+    for the first page. Returns (rows, next_cursor) — pass next_cursor back
+    in to get the following page without an OFFSET scan.
+    """
+    before_ts, before_id = before if before else (None, None)
+    rows = conn.execute("""
+        SELECT * FROM listings
+        WHERE (? IS NULL OR created_at < ? OR (created_at = ? AND id < ?))
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, (before_ts, before_ts, before_ts, before_id, limit)).fetchall()
+    next_cursor = (rows[-1]['created_at'], rows[-1]['id']) if rows else None
+    return rows, next_cursor
+
+
+conn = get_read_connection()
 try:
-    cursor.execute("SELECT COUNT(*) as count FROM listings")
-    total = cursor.fetchone()['count']
+    total = conn.execute("SELECT COUNT(*) as count FROM listings").fetchone()['count']
     print(f"Total listings in DB: {total}")
     
-    cursor.execute("SELECT * FROM listings ORDER BY created_at DESC LIMIT 5")
-    rows = cursor.fetchall()
+    rows, _ = fetch_recent_listings(conn, limit=5)
     print(f"Last 5 listings:")
     for row in rows:
         print(f"- [{row['created_at']}] {row['category']} ({row['listing_type']}): {row['message'][:30]}...")
@@ -12,6 +12,7 @@ mock_update.effective_chat.type = 'group'
 mock_update.effective_user.id = 12345
 mock_update.effective_user.username = "test_user"
 mock_update.effective_user.first_name = "Test"
+mock_update.effective_user.is_bot = False
 mock_update.message.text = "Need 2BHK for rent"
 mock_update.message.message_id = 999
 
@@ -35,25 +36,27 @@ def mock_classify(text):
         "gender_preference": None
     }
 
+def mock_classify_batch(texts):
+    return [mock_classify(text) for text in texts]
+
 classifier.classifier.classify = mock_classify
+classifier.classifier.classify_batch = mock_classify_batch
 
 # Import bot logic
 from bot import handle_message, init_db
-from database import get_connection
+from database import get_columns, flush_listings
 
 async def run_diagnostic():
     print("1. Initializing DB...")
     init_db()
     
     # Verify migration worked
-    conn = get_connection()
-    cols = [row[1] for row in conn.execute("PRAGMA table_info(lead_requests)").fetchall()]
+    cols = get_columns("lead_requests")
     print(f"   DB Columns in lead_requests: {cols}")
     if 'listing_type' in cols:
         print("   [OK] Migration SUCCESS: listing_type column exists")
     else:
         print("   [FAIL] Migration FAILED: listing_type missing")
-    conn.close()
 
     print("\n2. Simulating Group Message: 'Need 2BHK for rent'...")
     try:
@@ -68,6 +71,12 @@ async def run_diagnostic():
                 print("   [OK] Deep link present in reply")
         else:
             print("   [WARN] Bot did NOT reply (maybe no matches found?)")
+        
+        # The query is buffered (write-behind); the bot flushes every few seconds
+        if flush_listings() == 1:
+            print("   [OK] Query listing written on flush")
+        else:
+            print("   [FAIL] Query listing was not buffered")
             
     except Exception as e:
         print(f"   [FAIL] CRASHED: {e}")
@@ -1,55 +1,106 @@
-
 import asyncio
+import os
 from unittest.mock import AsyncMock, MagicMock
-from telegram import Update, User, Message, CallbackQuery
+from telegram import Update
 from telegram.ext import ContextTypes
 import sys
-import io
 
 # Fix encoding
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+# Block-buffered: output is flushed in a few large writes instead of per line
+sys.stdout.reconfigure(encoding='utf-8', errors='replace', line_buffering=False)
+
+# Run against a throwaway in-memory DB (no writes to housing_bot.db, no lock
+# contention with a running bot) unless DATABASE_PATH is set explicitly
+os.environ.setdefault("DATABASE_PATH", "file::memory:?cache=shared")
 
 # Import the handler
 try:
-    from bot import handle_buy_callback
-    print("[INFO] Successfully imported handle_buy_callback")
+    from bot import handle_start
+    from database import init_db, save_lead_request
+    print("[INFO] Successfully imported handle_start")
 except ImportError as e:
     print(f"[ERROR] Failed to import: {e}")
     sys.exit(1)
 
-async def test_handler():
-    # Mock Update
-    update = MagicMock(spec=Update)
-    update.callback_query = MagicMock(spec=CallbackQuery)
-    update.callback_query.data = "buy_t1_123"
-    update.callback_query.answer = AsyncMock()
-    update.callback_query.message.reply_text = AsyncMock()
-    
+
+# spec= introspects the Telegram class, so build the mock once and reset it
+# per case instead of rebuilding
+_UPDATE_TEMPLATE = MagicMock(spec=Update)
+
+
+def fresh_update():
+    _UPDATE_TEMPLATE.reset_mock(return_value=True, side_effect=True)
+    return _UPDATE_TEMPLATE
+
+
+# The ways /start can answer, run against one import of bot:
+# (deep-link payload, attribute the reply goes through, expected reply text).
+# "{request_id}" is filled in with a freshly saved lead request.
+CASES = (
+    (None, "message.reply_text", "Society Ka Bot"),
+    ("leads_{request_id}", "message.reply_text", "No contacts available"),
+    ("leads_abc", "message.reply_text", "Invalid link"),
+)
+
+
+def _resolve(obj, path):
+    """Follow a dotted attribute path, returning (parent, last attribute name)."""
+    *parents, attr = path.split(".")
+    for name in parents:
+        obj = getattr(obj, name)
+    return obj, attr
+
+
+async def test_handler(arg, reply_attr, expected):
+    # Mock Update (a DM, optionally with the deep-link payload from the group's Get Leads button)
+    update = fresh_update()
+    update.effective_user.id = 12345
+    update.effective_chat.type = "private"
+    parent, attr = _resolve(update, reply_attr)
+    setattr(parent, attr, AsyncMock())
+    reply = getattr(parent, attr)
+
     # Mock Context
     context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
-    
-    print("1. calling handle_buy_callback with 'buy_t1_123'...")
+    context.args = [arg] if arg else []
+
+    print(f"\n1. calling handle_start with '{arg}' (expecting {reply_attr} with '{expected}')...")
     try:
-        await handle_buy_callback(update, context)
+        await handle_start(update, context)
         print("[PASS] Handler executed without exception.")
-        
-        # Verify reply_text was called
-        if update.callback_query.message.reply_text.called:
-            args, kwargs = update.callback_query.message.reply_text.call_args
+
+        # Verify the reply was sent
+        if reply.called:
+            args, kwargs = reply.call_args
+            text = args[0] if args else kwargs.get('text')
             print("\n[INFO] Bot Reply Text:")
-            print(args[0])
-            print("\n[INFO] Reply Markup Keys:")
-            if 'reply_markup' in kwargs:
+            print(text)
+            if expected in text:
+                print("[PASS] Reply matches.")
+            else:
+                print(f"[FAIL] Expected a reply containing '{expected}'")
+            if 'reply_markup' in kwargs and kwargs['reply_markup']:
+                print("\n[INFO] Reply Markup Keys:")
                 for row in kwargs['reply_markup'].inline_keyboard:
                     for btn in row:
-                        print(f" - Button: {btn.text} (URL: {getattr(btn, 'url', 'None')}, Callback: {getattr(btn, 'callback_data', 'None')})")
+                        print(f" - Button: {btn.text} (URL: {getattr(btn, 'url', 'None')})")
         else:
             print("[FAIL] Bot did not reply!")
-            
+
     except Exception as e:
         print(f"[FAIL] Handler crashed: {e}")
         import traceback
         traceback.print_exc()
 
+
+async def main():
+    init_db()
+    # A request in a category with no listings: the bot should say so
+    request_id = save_lead_request(user_id=12345, category="pest_control")
+    for arg, reply_attr, expected in CASES:
+        if arg:
+            arg = arg.format(request_id=request_id)
+        await test_handler(arg, reply_attr, expected)
+
 if __name__ == "__main__":
-    asyncio.run(test_handler())
+    asyncio.run(main())
@@ -2,7 +2,6 @@
 Test script to verify Lead Deduplication logic.
 """
 import database
-import time
 
 def test_deduplication():
     print("0. Initializing DB...")
@@ -17,36 +16,25 @@ def test_deduplication():
     )
     print(f"   [OK] Created Request #{request_id}")
     
-    # 2. Add DUPLICATE listings (Same user, same contact)
-    # Listing 1
-    database.add_listing(
-        user_id=101, username="seller1", first_name="Seller", message_id=1, chat_id=1,
-        category="TestCat", subcategory=None, listing_type="offer", 
-        contact="9876543210", message="Offer 1"
-    )
-    time.sleep(1) # Ensure timestamp diff
-    
-    # Listing 2 (Same User, Same Contact)
-    database.add_listing(
-        user_id=101, username="seller1", first_name="Seller", message_id=2, chat_id=1,
-        category="TestCat", subcategory=None, listing_type="offer", 
-        contact="9876543210", message="Offer 2 (Duplicate)"
-    )
-    time.sleep(1)
-    
-    # Listing 3 (Different User, Same Contact - e.g. broker using 2 accounts)
-    database.add_listing(
-        user_id=102, username="seller2", first_name="Seller2", message_id=3, chat_id=1,
-        category="TestCat", subcategory=None, listing_type="offer", 
-        contact="9876543210", message="Offer 3 (Same Contact)"
-    )
-    
-    # Listing 4 (Unique)
-    database.add_listing(
-        user_id=103, username="seller3", first_name="Seller3", message_id=4, chat_id=1,
-        category="TestCat", subcategory=None, listing_type="offer", 
-        contact="1122334455", message="Offer 4 (Unique)"
-    )
+    # 2. Add DUPLICATE listings (Same user, same contact) in one transaction
+    database.add_listings_bulk([
+        # Listing 1
+        dict(user_id=101, username="seller1", first_name="Seller", message_id=1, chat_id=1,
+             category="TestCat", subcategory=None, listing_type="offer",
+             contact="9876543210", message="Offer 1", created_at="2024-01-01 00:00:01"),
+        # Listing 2 (Same User, Same Contact)
+        dict(user_id=101, username="seller1", first_name="Seller", message_id=2, chat_id=1,
+             category="TestCat", subcategory=None, listing_type="offer",
+             contact="9876543210", message="Offer 2 (Duplicate)", created_at="2024-01-01 00:00:02"),
+        # Listing 3 (Different User, Same Contact - e.g. broker using 2 accounts)
+        dict(user_id=102, username="seller2", first_name="Seller2", message_id=3, chat_id=1,
+             category="TestCat", subcategory=None, listing_type="offer",
+             contact="9876543210", message="Offer 3 (Same Contact)", created_at="2024-01-01 00:00:03"),
+        # Listing 4 (Unique)
+        dict(user_id=103, username="seller3", first_name="Seller3", message_id=4, chat_id=1,
+             category="TestCat", subcategory=None, listing_type="offer",
+             contact="1122334455", message="Offer 4 (Unique)", created_at="2024-01-01 00:00:04"),
+    ])
     
     print("   [OK] Added 4 listings (3 share same contact/user)")
     
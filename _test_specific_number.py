@@ -1,23 +1,14 @@
 
 import re
 
+from llm_classifier import _PHONE_RE
+
 def test_custom_number():
     text = "+9128334545678"
     
-    # The regex from llm_classifier.py
-    patterns = [
-        # 10 digits start with 6-9, optionally separated by space/dash
-        r'\b[6-9](?:\d[-\s]?){9}\b',
-        # +91 or 91 or 0 followed by 10 digits (with separators)
-        r'(?:\+91|91|0)[-\s]?[6-9](?:\d[-\s]?){9}\b'
-    ]
-    
-    found = None
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            found = match.group()
-            break
+    # Use the production regex from llm_classifier.py
+    match = _PHONE_RE.search(text)
+    found = match.group() if match else None
             
     print(f"Input: {text}")
     print(f"Matched: {found}")
@@ -7,16 +7,40 @@ Monetized via Razorpay Payment Links for verified lead access.
 
 import logging
 import datetime
+import time
 import json
+import re
 import hmac
 import hashlib
 import asyncio
+import collections
+import signal
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlparse
 
 import razorpay
+import requests
+from requests.adapters import HTTPAdapter
 from aiohttp import web
 
+# Optional faster event loop (not available on Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Optional C JSON parser for webhook bodies; stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 from telegram import (
-    Update,
+    Update, BotCommand,
     InlineKeyboardButton, InlineKeyboardMarkup
 )
 from telegram.ext import (
@@ -29,17 +53,20 @@ from config import (
     BOT_TOKEN, ALLOWED_CHAT_IDS, BOT_ADMIN_ID, BOT_USERNAME,
     FREE_LEADS_COUNT, TIER1_PRICE, TIER1_LEADS, TIER2_PRICE, TIER2_LEADS,
     RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET, RAZORPAY_WEBHOOK_SECRET,
-    WEBHOOK_BASE_URL, WEBHOOK_PORT
+    WEBHOOK_BASE_URL, WEBHOOK_PORT, LISTING_FLUSH_INTERVAL, LISTING_FLUSH_BATCH,
+    TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET
 )
 from database import (
-    init_db, add_listing, get_stats, cleanup_expired,
+    init_db, queue_listing, flush_listings, get_stats, cleanup_expired,
     save_lead_request, get_lead_request, get_leads_for_request, 
-    save_payment_claim, get_payment_by_link_id, update_payment_status
+    save_payment_claim, mark_payment_paid_by_link
 )
-from classifier import classifier
+from classifier_cache import classify_batched, evict_cache
+from llm_classifier import llm_classifier
+from keywords import CATEGORY_EMOJIS
 from matcher import (
     find_matches, find_interested_buyers, build_label,
-    format_free_leads, format_upsell_message, format_paid_leads
+    format_free_leads, format_upsell_message, iter_paid_leads
 )
 
 # Configure logging
@@ -49,14 +76,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Razorpay client
+# Threads for blocking calls (SQLite, LLM, Razorpay) made from handlers
+BLOCKING_IO_WORKERS = 16
+
+# Initialize Razorpay client. Its requests.Session keeps connections alive;
+# size the pool so concurrent calls from worker threads all reuse TLS
+# connections instead of opening (and dropping) extra ones.
 razorpay_client = None
 if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    _razorpay_session = requests.Session()
+    _razorpay_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=BLOCKING_IO_WORKERS))
+    razorpay_client = razorpay.Client(
+        session=_razorpay_session, auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)
+    )
     logger.info("Razorpay client initialized")
 else:
     logger.warning("Razorpay keys not set! Payment links will not work.")
 
+# Webhook signatures are HMAC-SHA256; OpenSSL's implementation uses the CPU's
+# SHA extensions, the builtin fallback is several times slower
+if hashlib.sha256.__module__ != "_hashlib":
+    logger.warning("hashlib is not backed by OpenSSL; webhook signature checks will be slow.")
+
 
 def is_allowed_chat(chat_id: int) -> bool:
     """Check if a chat is in the allowed list. If no list is set, allow all."""
@@ -95,148 +136,182 @@ async def handle_bot_added(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─── Group Message Handler ────────────────────────────────────
 
 
+def group_message_filter() -> filters.BaseFilter:
+    """
+    New text messages (not edits, not commands) in groups the bot is allowed
+    in. Checked by the dispatcher, so other updates never reach handle_message.
+    """
+    group_text = (
+        filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND & ~filters.VIA_BOT
+        & (filters.ChatType.GROUP | filters.ChatType.SUPERGROUP)
+    )
+    if ALLOWED_CHAT_IDS:
+        return group_text & filters.Chat(chat_id=ALLOWED_CHAT_IDS)
+    return group_text
+
+
+_GET_LEADS_URL = f"https://t.me/{BOT_USERNAME}?start=leads_"
+
+
+def _get_leads_keyboard(request_id: int) -> InlineKeyboardMarkup:
+    """The "Get Leads" deep-link button for a group reply."""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔍 Get Leads", url=f"{_GET_LEADS_URL}{request_id}")
+    ]])
+
+
+# (chat_id, message_id) of recently handled group messages
+RECENT_MESSAGES_MAX = 4096
+_recent_messages: "collections.OrderedDict[tuple, None]" = collections.OrderedDict()
+
+
+# Per-chat ordering without blocking other chats: each message waits for
+# the previous message in its chat to finish before storing and replying.
+# chat_id -> future resolved when the latest message in that chat is done.
+_chat_tails: dict = {}
+
+
+def _take_chat_turn(chat_id: int):
+    """Queue up in a chat; returns (future to wait for or None, this turn)."""
+    previous = _chat_tails.get(chat_id)
+    turn = asyncio.get_running_loop().create_future()
+    _chat_tails[chat_id] = turn
+    return previous, turn
+
+
+def _end_chat_turn(chat_id: int, previous: Optional[asyncio.Future], turn: asyncio.Future):
+    """Finish a turn, once the one before it has (ignored messages end early)."""
+    def finish(_=None):
+        if not turn.done():
+            turn.set_result(None)
+        if _chat_tails.get(chat_id) is turn:
+            del _chat_tails[chat_id]  # Nothing queued behind it
+    
+    if previous is None or previous.done():
+        finish()
+    else:
+        previous.add_done_callback(finish)
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle all incoming group messages."""
+    """Handle incoming group messages (update type, chat type and allow-list: see group_message_filter)."""
     
-    # Only process group messages
-    if not update.message or not update.message.text:
-        return
+    # Log every message at DEBUG. Per-message lines use lazy %-style args,
+    # so with INFO logging in production nothing is formatted or sliced
+    logger.debug("Received message in chat %s: %.20s...", update.effective_chat.id, update.message.text)
     
-    # DEBUG: Log every message to see if we're receiving them
-    logger.info(f"Received message in chat {update.effective_chat.id}: {update.message.text[:20]}...")
+    text = update.message.text
+    user = update.effective_user
     
-    # Skip if not from a group
-    if update.effective_chat.type not in ['group', 'supergroup']:
+    # Other bots' posts aren't listings. Anonymous admins and linked channels
+    # also post as bots (GroupAnonymousBot / Channel_Bot), but with
+    # sender_chat set: those are real posts, keep them.
+    if user is None or (user.is_bot and update.message.sender_chat is None):
         return
     
-    # Skip if not an allowed group
-    if not is_allowed_chat(update.effective_chat.id):
+    # Telegram re-sends updates it thinks weren't received (webhook retries,
+    # polling restarts); classify and store each message only once
+    msg_key = (update.effective_chat.id, update.message.message_id)
+    if msg_key in _recent_messages:
         return
+    _recent_messages[msg_key] = None
+    if len(_recent_messages) > RECENT_MESSAGES_MAX:
+        _recent_messages.popitem(last=False)
     
-    text = update.message.text
-    user = update.effective_user
+    chat_id = update.effective_chat.id
+    previous, turn = _take_chat_turn(chat_id)
+    try:
+        # Classify the message using LLM (repeats are served from the cache).
+        # Not under the chat's turn, so messages still share LLM batches.
+        result = await classify_batched(text)
+        
+        if not result:
+            # Message doesn't match any category or is irrelevant - stay silent
+            logger.debug("Ignored message: %.50s...", text)
+            return
+        
+        # Store and reply in the order messages arrived in this chat
+        # Shielded: if this handler is cancelled, the shared turn must not be
+        if previous is not None:
+            await asyncio.shield(previous)
+        await _handle_classified(update, text, result)
+    finally:
+        _end_chat_turn(chat_id, previous, turn)
+
+
+def _match_and_save_request(finder, user_id: int, chat_id: int, result: dict, text: str):
+    """
+    Run the matcher and, if it found anything, save the lead request behind
+    the Get Leads button — one worker-thread hop (and one thread-local
+    connection) instead of two. Returns (response, request_id).
+    """
+    response = finder(
+        category=result["category"],
+        subcategory=result["subcategory"],
+        property_type=result.get("property_type"),
+        gender_preference=result.get("gender_preference"),
+        chat_id=chat_id,
+        original_message=text
+    )
+    if not response:
+        return None, None
     
-    # Classify the message using LLM
-    result = classifier.classify(text)
+    request_id = save_lead_request(
+        user_id=user_id,
+        category=result["category"],
+        subcategory=result["subcategory"],
+        property_type=result.get("property_type"),
+        gender_preference=result.get("gender_preference"),
+        listing_type=result["listing_type"],
+        source_chat_id=chat_id
+    )
+    return response, request_id
+
+
+async def _handle_classified(update: Update, text: str, result: dict):
+    """Store a classified group message and reply with matches, if any."""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+    listing_type = result["listing_type"]
+    logger.info("Classified: %s", result)
     
-    if not result:
-        # Message doesn't match any category or is irrelevant - stay silent
-        logger.debug(f"Ignored message: {text[:50]}...")
+    if listing_type not in ("offer", "query"):
         return
     
-    logger.info(f"Classified: {result}")
-    
-    if result["listing_type"] == "offer":
-        # Store the listing silently with metadata
-        listing_id = add_listing(
-            user_id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            message_id=update.message.message_id,
-            chat_id=update.effective_chat.id,
-            category=result["category"],
-            subcategory=result["subcategory"],
-            listing_type="offer",
-            contact=result["contact"],
-            message=text,
-            property_type=result.get("property_type"),
-            gender_preference=result.get("gender_preference")
-        )
-        logger.info(f"Stored listing #{listing_id} in category: {result['category']}")
-        
-        # Show interested buyers if any exist
-        response = find_interested_buyers(
-            category=result["category"],
-            subcategory=result["subcategory"],
-            property_type=result.get("property_type"),
-            gender_preference=result.get("gender_preference"),
-            chat_id=update.effective_chat.id,
-            original_message=text
-        )
-        
-        if response:
-            # Save a lead request for this match
-            request_id = save_lead_request(
-                user_id=user.id,
-                category=result["category"],
-                subcategory=result["subcategory"],
-                property_type=result.get("property_type"),
-                gender_preference=result.get("gender_preference"),
-                listing_type="offer",
-                source_chat_id=update.effective_chat.id
-            )
-            
-            # Add "Get Leads" deep-link button
-            keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton(
-                    "🔍 Get Leads",
-                    url=f"https://t.me/{BOT_USERNAME}?start=leads_{request_id}"
-                )
-            ]])
-            
-            await update.message.reply_text(
-                response,
-                parse_mode='Markdown',
-                reply_markup=keyboard
-            )
-            logger.info(f"Showed interested buyers for: {result['category']}")
-        # No response if no buyers - silent save
-    
-    elif result["listing_type"] == "query":
-        # Store the query silently with metadata
-        query_id = add_listing(
-            user_id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            message_id=update.message.message_id,
-            chat_id=update.effective_chat.id,
-            category=result["category"],
-            subcategory=result["subcategory"],
-            listing_type="query",
-            contact=result["contact"],
-            message=text,
-            property_type=result.get("property_type"),
-            gender_preference=result.get("gender_preference")
-        )
-        logger.info(f"Stored query #{query_id} in category: {result['category']}")
-        
-        # Show matching listings if any exist (cross-group)
-        response = find_matches(
-            category=result["category"],
-            subcategory=result["subcategory"],
-            property_type=result.get("property_type"),
-            gender_preference=result.get("gender_preference"),
-            chat_id=update.effective_chat.id,
-            original_message=text
+    # Store the listing/query silently with metadata
+    waiting = queue_listing(
+        user_id=user.id,
+        username=user.username,
+        first_name=user.first_name,
+        message_id=update.message.message_id,
+        chat_id=chat_id,
+        category=result["category"],
+        subcategory=result["subcategory"],
+        listing_type=listing_type,
+        contact=result["contact"],
+        message=text,
+        property_type=result.get("property_type"),
+        gender_preference=result.get("gender_preference"),
+        short_detail=result.get("short_detail")
+    )
+    logger.info("Queued %s in category: %s", listing_type, result['category'])
+    if waiting >= LISTING_FLUSH_BATCH:
+        _flush_now.set()
+    
+    # Offers are shown interested buyers, queries matching listings (cross-group)
+    finder = find_interested_buyers if listing_type == "offer" else find_matches
+    response, request_id = await asyncio.to_thread(
+        _match_and_save_request, finder, user.id, chat_id, result, text
+    )
+    
+    if response:
+        await update.message.reply_text(
+            response,
+            parse_mode='Markdown',
+            reply_markup=_get_leads_keyboard(request_id)
         )
-        
-        if response:
-            # Save a lead request for deep link
-            request_id = save_lead_request(
-                user_id=user.id,
-                category=result["category"],
-                subcategory=result["subcategory"],
-                property_type=result.get("property_type"),
-                gender_preference=result.get("gender_preference"),
-                listing_type="query",
-                source_chat_id=update.effective_chat.id
-            )
-            
-            # Add "Get Leads" deep-link button
-            keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton(
-                    "🔍 Get Leads",
-                    url=f"https://t.me/{BOT_USERNAME}?start=leads_{request_id}"
-                )
-            ]])
-            
-            await update.message.reply_text(
-                response,
-                parse_mode='Markdown',
-                reply_markup=keyboard
-            )
-            logger.info(f"Responded to query for: {result['category']}")
-        # No response if no matches - silent save
+        logger.info("Replied to %s for: %s", listing_type, result['category'])
+    # No response if no matches - silent save
 
 
 # ─── Deep Link Handler (DM) ──────────────────────────────────
@@ -257,7 +332,8 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await help_command(update, context)
 
 
-def _create_razorpay_link(amount: int, description: str, request_id: int, user_id: int) -> dict:
+def _create_razorpay_link(amount: int, description: str, request_id: int = None, user_id: int = None,
+                          expire_by: int = None, tier: str = None) -> dict:
     """Create a Razorpay Payment Link and return the response."""
     if not razorpay_client:
         raise Exception("Razorpay not configured")
@@ -266,43 +342,164 @@ def _create_razorpay_link(amount: int, description: str, request_id: int, user_i
         "amount": amount * 100,  # Razorpay uses paise (₹49 = 4900 paise)
         "currency": "INR",
         "description": description,
-        "notes": {
-            "request_id": str(request_id),
-            "user_id": str(user_id),
-        },
+        # Our own id for the link, so it can be traced in the Razorpay dashboard
+        "reference_id": f"hsb_{uuid.uuid4().hex[:20]}",
         "callback_url": f"{WEBHOOK_BASE_URL}/razorpay/callback" if WEBHOOK_BASE_URL else "",
         "callback_method": "get"
     }
+    notes = {}
+    if tier is not None:
+        notes["tier"] = tier
+    if request_id is not None:
+        notes["request_id"] = str(request_id)
+        notes["user_id"] = str(user_id)
+    if notes:
+        payload["notes"] = notes
+    if expire_by is not None:
+        payload["expire_by"] = expire_by
     
     return razorpay_client.payment_link.create(payload)
 
 
-async def _handle_get_leads(update: Update, context: ContextTypes.DEFAULT_TYPE, arg: str):
-    """Handle the deep link when user clicks 'Get Leads' from group."""
-    try:
-        request_id = int(arg.replace("leads_", ""))
-    except ValueError:
-        await update.message.reply_text("❌ Invalid link. Please try again from the group.")
+# Pre-minted payment links per tier, so "Get Leads" doesn't wait on Razorpay.
+# Pooled links are minted before any request exists, so they carry only the
+# tier (no label or per-user notes); the webhook only needs the link id,
+# which is tied to the user when the claim is saved. They expire after a day
+# so unused ones don't pile up as payable links. The deques are shared by
+# worker threads: only touch them under _link_pool_lock.
+LINK_POOL_SIZE = 10
+LINK_POOL_REFILL_INTERVAL = 60  # seconds
+LINK_POOL_EXPIRY = 24 * 60 * 60  # seconds
+LINK_POOL_MIN_VALIDITY = 60 * 60  # don't hand out links closer than this to expiry
+_link_pool = {"t1": collections.deque(), "t2": collections.deque()}
+_link_pool_lock = threading.Lock()
+
+
+def _refill_link_pool():
+    """Top up each tier's pool (blocking; run in a thread)."""
+    if not razorpay_client:
         return
-    
-    # Fetch the lead request
+    tiers = [
+        ("t1", TIER1_PRICE, f"Tier 1: Unlock {TIER1_LEADS} society contacts"),
+        ("t2", TIER2_PRICE, f"Tier 2: Unlock {TIER2_LEADS} society contacts + tips"),
+    ]
+    for tier, amount, description in tiers:
+        pool = _link_pool[tier]
+        while len(pool) < LINK_POOL_SIZE:
+            expire_by = int(time.time()) + LINK_POOL_EXPIRY
+            link = _create_razorpay_link(amount, description, expire_by=expire_by, tier=tier)
+            with _link_pool_lock:
+                pool.append(link)
+
+
+def _cancel_links(links: list):
+    """Cancel unused payment links at Razorpay so they can't be paid (blocking)."""
+    for link in links:
+        try:
+            razorpay_client.payment_link.cancel(link["id"])
+        except Exception as e:
+            logger.warning(f"Failed to cancel pooled payment link {link['id']}: {e}")
+
+
+def _cancel_pooled_links():
+    """Cancel the links left in the pools (blocking; run in a thread on shutdown)."""
+    if not razorpay_client:
+        return
+    with _link_pool_lock:
+        leftover = [link for pool in _link_pool.values() for link in pool]
+        for pool in _link_pool.values():
+            pool.clear()
+    _cancel_links(leftover)
+
+
+def _take_pooled_link(tier: str) -> Optional[dict]:
+    """Pop a pooled link for the tier with enough validity left, or None."""
+    stale = []
+    with _link_pool_lock:
+        pool = _link_pool[tier]
+        # Drop links too close to expiry for the user to pay them
+        while pool and pool[0].get("expire_by", 0) < time.time() + LINK_POOL_MIN_VALIDITY:
+            stale.append(pool.popleft())
+        link = pool.popleft() if pool else None
+    if stale:
+        _cancel_links(stale)
+    return link
+
+
+async def link_pool_loop():
+    """Keep the payment link pools filled."""
+    while True:
+        try:
+            await asyncio.to_thread(_refill_link_pool)
+        except Exception as e:
+            logger.error(f"Failed to refill payment link pool: {e}")
+        await asyncio.sleep(LINK_POOL_REFILL_INTERVAL)
+
+
+def _create_tier_link(amount: int, tier: str, description: str, request_id: int, user_id: int) -> dict:
+    """Take (or create) the payment link for one tier and record its pending claim."""
+    link = _take_pooled_link(tier)
+    if link is None:
+        link = _create_razorpay_link(amount, description, request_id, user_id, tier=tier)
+    save_payment_claim(
+        user_id=user_id,
+        request_id=request_id,
+        amount=amount,
+        tier=tier,
+        razorpay_link_id=link["id"],
+        razorpay_reference_id=link.get("reference_id") or ""
+    )
+    return link
+
+
+# Deep-link payload "leads_<request id>": validated and parsed in one match.
+# Stricter than int(), which would also take "leads_+1" or "leads_1_000".
+_LEADS_ARG_RE = re.compile(r"leads_(\d{1,18})")
+
+
+def _load_free_leads(request_id: int) -> tuple:
+    """
+    (lead request, label, free leads, free leads message, total available);
+    the message is None if nothing matches, and lead request is None for an
+    unknown ID.
+    Formatting can call the LLM (summaries), so this runs in a worker thread.
+    """
     lead_req = get_lead_request(request_id)
     if not lead_req:
-        await update.message.reply_text("❌ This link has expired. Please try again from the group.")
-        return
-    
-    user_id = update.effective_user.id
+        return None, None, [], None, 0
     label = build_label(
         lead_req["category"],
         lead_req.get("subcategory"),
         lead_req.get("property_type"),
         lead_req.get("gender_preference")
     )
+    # The total comes back with the free page, so no second query to count
+    free_listings, total = get_leads_for_request(
+        request_id, limit=FREE_LEADS_COUNT, offset=0, with_count=True
+    )
+    free_msg = format_free_leads(free_listings, label) if free_listings else None
+    return lead_req, label, free_listings, free_msg, total
+
+
+async def _handle_get_leads(update: Update, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    """Handle the deep link when user clicks 'Get Leads' from group."""
+    match = _LEADS_ARG_RE.fullmatch(arg)
+    if not match:
+        await update.message.reply_text("❌ Invalid link. Please try again from the group.")
+        return
+    request_id = int(match.group(1))
+    
+    # Fetch the lead request and format its free page (with the total) in one hop
+    lead_req, label, free_listings, free_msg, total_available = await asyncio.to_thread(
+        _load_free_leads, request_id
+    )
+    if not lead_req:
+        await update.message.reply_text("❌ This link has expired. Please try again from the group.")
+        return
     
-    # Get free leads (first 1)
-    free_listings = get_leads_for_request(request_id, limit=FREE_LEADS_COUNT, offset=0)
+    user_id = update.effective_user.id
     
-    if not free_listings:
+    if not free_msg:
         await update.message.reply_text(
             f"😔 No contacts available for *{label}* right now. We'll notify you when new listings come in!",
             parse_mode='Markdown'
@@ -310,65 +507,32 @@ async def _handle_get_leads(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     # Send free leads
-    free_msg = format_free_leads(free_listings, label)
     await update.message.reply_text(free_msg, parse_mode='Markdown')
     
-    # Check how many more are available
-    all_listings = get_leads_for_request(request_id, limit=100, offset=0)
-    total_available = len(all_listings)
-    
     if total_available > FREE_LEADS_COUNT:
         # Create Razorpay Payment Links for both tiers
         upsell_msg = format_upsell_message(total_available, category=lead_req["category"])
         
-        buttons = []
+        tiers = [
+            ("t1", TIER1_PRICE, f"Unlock {TIER1_LEADS} contacts for {label}",
+             f"🔓 Unlock {TIER1_LEADS} Contacts — ₹{TIER1_PRICE}"),
+            ("t2", TIER2_PRICE, f"Unlock {TIER2_LEADS} contacts + tips for {label}",
+             f"🔓 Unlock {TIER2_LEADS} Contacts + Tips — ₹{TIER2_PRICE}"),
+        ]
         
-        # Tier 1 payment link
-        try:
-            t1_link = _create_razorpay_link(
-                amount=TIER1_PRICE,
-                description=f"Unlock {TIER1_LEADS} contacts for {label}",
-                request_id=request_id,
-                user_id=user_id
-            )
-            # Save to DB
-            save_payment_claim(
-                user_id=user_id,
-                request_id=request_id,
-                amount=TIER1_PRICE,
-                tier="t1",
-                razorpay_link_id=t1_link["id"]
-            )
-            buttons.append([InlineKeyboardButton(
-                f"🔓 Unlock {TIER1_LEADS} Contacts — ₹{TIER1_PRICE}",
-                url=t1_link["short_url"]
-            )])
-            logger.info(f"Created Razorpay link {t1_link['id']} for ₹{TIER1_PRICE}")
-        except Exception as e:
-            logger.error(f"Failed to create Tier 1 payment link: {e}")
+        # The two links are independent Razorpay calls — create them concurrently
+        links = await asyncio.gather(*(
+            asyncio.to_thread(_create_tier_link, price, tier, description, request_id, user_id)
+            for tier, price, description, _ in tiers
+        ), return_exceptions=True)
         
-        # Tier 2 payment link
-        try:
-            t2_link = _create_razorpay_link(
-                amount=TIER2_PRICE,
-                description=f"Unlock {TIER2_LEADS} contacts + tips for {label}",
-                request_id=request_id,
-                user_id=user_id
-            )
-            save_payment_claim(
-                user_id=user_id,
-                request_id=request_id,
-                amount=TIER2_PRICE,
-                tier="t2",
-                razorpay_link_id=t2_link["id"]
-            )
-            buttons.append([InlineKeyboardButton(
-                f"🔓 Unlock {TIER2_LEADS} Contacts + Tips — ₹{TIER2_PRICE}",
-                url=t2_link["short_url"]
-            )])
-            logger.info(f"Created Razorpay link {t2_link['id']} for ₹{TIER2_PRICE}")
-        except Exception as e:
-            logger.error(f"Failed to create Tier 2 payment link: {e}")
+        buttons = []
+        for (tier, price, _, button_text), link in zip(tiers, links):
+            if isinstance(link, Exception):
+                logger.error(f"Failed to create {tier} payment link: {link}")
+                continue
+            buttons.append([InlineKeyboardButton(button_text, url=link["short_url"])])
+            logger.info(f"Created Razorpay link {link['id']} for ₹{price}")
         
         if buttons:
             await update.message.reply_text(
@@ -377,15 +541,9 @@ async def _handle_get_leads(update: Update, context: ContextTypes.DEFAULT_TYPE,
                 reply_markup=InlineKeyboardMarkup(buttons)
             )
         else:
-            await update.message.reply_text(
-                "⚠ Payment system is temporarily unavailable. Please try again later.",
-                parse_mode='Markdown'
-            )
+            await update.message.reply_text("⚠ Payment system is temporarily unavailable. Please try again later.")
     else:
-        await update.message.reply_text(
-            "✅ That's all the contacts we have right now. Check back later for more!",
-            parse_mode='Markdown'
-        )
+        await update.message.reply_text("✅ That's all the contacts we have right now. Check back later for more!")
     
     logger.info(f"Sent {len(free_listings)} free leads to user {user_id} for request #{request_id}")
 
@@ -395,7 +553,7 @@ async def _handle_get_leads(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
 async def _deliver_leads(bot, claim: dict):
     """Deliver paid leads to the user after successful payment."""
-    lead_req = get_lead_request(claim["request_id"])
+    lead_req = await asyncio.to_thread(get_lead_request, claim["request_id"])
     if not lead_req:
         logger.error(f"Lead request #{claim['request_id']} not found for claim #{claim['id']}")
         return
@@ -416,35 +574,143 @@ async def _deliver_leads(bot, claim: dict):
         leads_count = TIER2_LEADS
         include_tips = True
     
-    paid_listings = get_leads_for_request(claim["request_id"], limit=leads_count, offset=FREE_LEADS_COUNT)
-    paid_msg = format_paid_leads(paid_listings, label, include_tips=include_tips, category=lead_req["category"])
+    paid_listings = await asyncio.to_thread(
+        get_leads_for_request, claim["request_id"], limit=leads_count, offset=FREE_LEADS_COUNT
+    )
+    chunks = iter_paid_leads(paid_listings, label, include_tips=include_tips, category=lead_req["category"])
     
+    # The admin notice doesn't wait on the user's messages
+    _queue_sale_notice(bot, claim)
+    await _send_paid_leads(bot, claim, chunks, len(paid_listings))
+
+
+async def _send_paid_leads(bot, claim: dict, chunks, count: int):
+    try:
+        # Send each batch as soon as it is formatted. Sent in order, since
+        # concurrent sends may arrive out of order. Formatting a batch can
+        # call the LLM (summaries for older listings), so it runs in a thread.
+        i = 0
+        while (paid_msg := await asyncio.to_thread(next, chunks, None)) is not None:
+            if i == 0:
+                paid_msg = f"✅ *Payment Received!*\n\n{paid_msg}"
+            await bot.send_message(
+                chat_id=claim["user_id"],
+                text=paid_msg,
+                parse_mode='Markdown'
+            )
+            i += 1
+        logger.info(f"Delivered {count} paid leads to user {claim['user_id']}")
+    except Exception as e:
+        logger.error(f"Failed to send leads to user {claim['user_id']}: {e}")
+
+
+# Sale notices for the admin are collected for ADMIN_NOTICE_WINDOW seconds
+# and sent as one message, so a burst of payments doesn't flood the admin
+# chat or eat into the bot's Telegram rate limit.
+ADMIN_NOTICE_WINDOW = 2.0
+_pending_sales: list = []
+_admin_notice_handle: Optional[asyncio.TimerHandle] = None
+
+
+def _format_sale_notice(claims: list) -> str:
+    # Payment ids ("pay_...") go in code spans: a bare "_" breaks legacy Markdown
+    if len(claims) == 1:
+        claim = claims[0]
+        return (
+            f"💰 *New Sale!*\n\n"
+            f"👤 User ID: {claim['user_id']}\n"
+            f"💵 Amount: ₹{claim['amount']}\n"
+            f"📄 Request: #{claim['request_id']}\n"
+            f"🆔 Razorpay: `{claim.get('razorpay_payment_id') or 'N/A'}`"
+        )
+    lines = [f"💰 *{len(claims)} New Sales!* (₹{sum(c['amount'] for c in claims)})\n"]
+    lines.extend(
+        f"👤 {c['user_id']} · ₹{c['amount']} · #{c['request_id']} · "
+        f"`{c.get('razorpay_payment_id') or 'N/A'}`"
+        for c in claims
+    )
+    return "\n".join(lines)
+
+
+def _queue_sale_notice(bot, claim: dict):
+    """Queue a sale notice for the admin; the window's notices go out together."""
+    global _admin_notice_handle
+    if not BOT_ADMIN_ID:
+        return
+    _pending_sales.append(claim)
+    if _admin_notice_handle is None:
+        _admin_notice_handle = asyncio.get_running_loop().call_later(
+            ADMIN_NOTICE_WINDOW, lambda: _track_task(_send_admin_notices(bot))
+        )
+
+
+async def _send_admin_notices(bot):
+    global _pending_sales, _admin_notice_handle
+    if _admin_notice_handle is not None:
+        _admin_notice_handle.cancel()  # When flushed early at shutdown
+        _admin_notice_handle = None
+    claims, _pending_sales = _pending_sales, []
+    if not claims:
+        return
     try:
         await bot.send_message(
-            chat_id=claim["user_id"],
-            text=f"✅ *Payment Received!*\n\n{paid_msg}",
+            chat_id=BOT_ADMIN_ID,
+            text=_format_sale_notice(claims),
             parse_mode='Markdown'
         )
-        logger.info(f"Delivered {len(paid_listings)} paid leads to user {claim['user_id']}")
     except Exception as e:
-        logger.error(f"Failed to send leads to user {claim['user_id']}: {e}")
+        logger.error(f"Failed to send sale notice to admin for {len(claims)} claim(s): {e}")
 
-    # Notify admin about the sale
-    if BOT_ADMIN_ID:
+
+# Cap on lead deliveries running at once (each makes several Telegram sends)
+DELIVERY_CONCURRENCY = 8
+_delivery_semaphore = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+_delivery_tasks: set = set()  # Strong refs so running deliveries aren't GC'd
+
+
+def _track_task(coro) -> asyncio.Task:
+    """Run a background delivery/notice task that shutdown waits for."""
+    task = asyncio.get_running_loop().create_task(coro)
+    _delivery_tasks.add(task)
+    task.add_done_callback(_delivery_tasks.discard)
+    return task
+
+
+async def _deliver_leads_bounded(bot, claim: dict):
+    """_deliver_leads for a background task: bounded, and never raises."""
+    async with _delivery_semaphore:
         try:
-            await bot.send_message(
-                chat_id=BOT_ADMIN_ID,
-                text=(
-                    f"💰 *New Sale!*\n\n"
-                    f"👤 User ID: {claim['user_id']}\n"
-                    f"💵 Amount: ₹{claim['amount']}\n"
-                    f"📄 Request: #{claim['request_id']}\n"
-                    f"🆔 Razorpay: {claim.get('razorpay_payment_id', 'N/A')}"
-                ),
-                parse_mode='Markdown'
-            )
-        except Exception:
-            pass
+            await _deliver_leads(bot, claim)
+        except Exception as e:
+            logger.error(f"Lead delivery failed for claim #{claim['id']}: {e}", exc_info=True)
+
+
+# Link ids already delivered, so Razorpay's retries of a paid webhook are
+# answered without a database lookup. Bounded; oldest entries drop first.
+DELIVERED_LINKS_MAX = 10_000
+_delivered_link_ids: "collections.OrderedDict[str, float]" = collections.OrderedDict()
+
+
+def _mark_delivered(link_id: str):
+    _delivered_link_ids[link_id] = time.time()
+    if len(_delivered_link_ids) > DELIVERED_LINKS_MAX:
+        _delivered_link_ids.popitem(last=False)
+
+
+# Pre-keyed HMAC for webhook signatures: (secret, hmac object). Rebuilt only
+# if the secret changes, so each webhook copies it instead of re-keying.
+_webhook_hmac = None
+
+
+def _get_webhook_hmac():
+    """Return the pre-keyed HMAC-SHA256 object for the current webhook secret."""
+    global _webhook_hmac
+    if _webhook_hmac is None or _webhook_hmac[0] != RAZORPAY_WEBHOOK_SECRET:
+        _webhook_hmac = (
+            RAZORPAY_WEBHOOK_SECRET,
+            hmac.new(RAZORPAY_WEBHOOK_SECRET.encode('utf-8'), digestmod=hashlib.sha256)
+        )
+    return _webhook_hmac[1]
 
 
 def _verify_webhook_signature(body: bytes, signature: str) -> bool:
@@ -453,48 +719,66 @@ def _verify_webhook_signature(body: bytes, signature: str) -> bool:
         logger.warning("RAZORPAY_WEBHOOK_SECRET not set, skipping signature verification")
         return True
     
-    expected = hmac.new(
-        RAZORPAY_WEBHOOK_SECRET.encode('utf-8'),
-        body,
-        hashlib.sha256
-    ).hexdigest()
+    mac = _get_webhook_hmac().copy()
+    mac.update(body)
     
-    return hmac.compare_digest(expected, signature)
+    return hmac.compare_digest(mac.hexdigest(), signature)
 
 
 # ─── Commands ─────────────────────────────────────────────────
 
 
+# /stats result, reused for STATS_CACHE_TTL seconds so repeated /stats in a
+# busy group don't each re-run the GROUP BY. Reset when new listings land.
+STATS_CACHE_TTL = 30
+_stats_cache = {"t": 0.0, "v": None}
+
+
+def _category_title(category: str) -> str:
+    """Display name for a category key, e.g. "Ac Repair" (a bare "_" breaks Markdown)."""
+    return category.replace('_', ' ').title()
+
+
+# "🏠 Property: " etc., built once instead of per /stats line
+_CATEGORY_PREFIX = {
+    category: f"{emoji} {_category_title(category)}: " for category, emoji in CATEGORY_EMOJIS.items()
+}
+
+
+def _get_stats_cached() -> dict:
+    now = time.monotonic()
+    if _stats_cache["v"] is None or now - _stats_cache["t"] >= STATS_CACHE_TTL:
+        _stats_cache["v"] = get_stats()
+        _stats_cache["t"] = now
+    return _stats_cache["v"]
+
+
+def _invalidate_stats_cache():
+    _stats_cache["v"] = None
+
+
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show statistics about active listings."""
     if update.effective_chat.type in ['group', 'supergroup']:
         if not is_allowed_chat(update.effective_chat.id):
             return
 
-    stats = get_stats()
+    stats = await asyncio.to_thread(_get_stats_cached)
     
     if stats["total"] == 0:
         await update.message.reply_text("📊 No active listings yet.")
         return
     
-    response = f"📊 *Active Listings*: {stats['total']}\n\n"
-    
-    from keywords import CATEGORY_EMOJIS
-    for category, count in stats["by_category"].items():
-        emoji = CATEGORY_EMOJIS.get(category, "📋")
-        response += f"{emoji} {category.title()}: {count}\n"
+    lines = [f"📊 *Active Listings*: {stats['total']}\n"]
+    lines.extend(
+        (_CATEGORY_PREFIX.get(category) or f"📋 {_category_title(category)}: ") + str(count)
+        for category, count in stats["by_category"].items()
+    )
     
-    await update.message.reply_text(response, parse_mode='Markdown')
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
 
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show help message."""
-    # In groups, check if allowed
-    if update.effective_chat.type in ['group', 'supergroup']:
-        if not is_allowed_chat(update.effective_chat.id):
-            return
-
-    help_text = """
+_HELP_TEXT = """
 🏠 *Society Ka Bot*
 
 I automatically match your queries with relevant listings across housing society groups!
@@ -523,14 +807,59 @@ I automatically match your queries with relevant listings across housing society
 🚗 Driver | ❄️ AC Repair | 📚 Tutor
 📦 Packers | 🚙 Vehicles
 """
-    await update.message.reply_text(help_text, parse_mode='Markdown')
+
+
+# Shown in Telegram's command menu; registered once at startup
+_BOT_COMMANDS = [
+    BotCommand("stats", "Show active listing count"),
+    BotCommand("help", "How the bot works"),
+]
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show help message."""
+    # In groups, check if allowed
+    if update.effective_chat.type in ['group', 'supergroup']:
+        if not is_allowed_chat(update.effective_chat.id):
+            return
+
+    await update.message.reply_text(_HELP_TEXT, parse_mode='Markdown')
+
+
+# Set when LISTING_FLUSH_BATCH listings are waiting, to flush before the interval
+_flush_now = asyncio.Event()
+
+
+async def flush_listings_loop():
+    """Write buffered listings to the database every few seconds, or sooner in a burst."""
+    while True:
+        try:
+            await asyncio.wait_for(_flush_now.wait(), LISTING_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        try:
+            written = await asyncio.to_thread(flush_listings)
+        except Exception as e:
+            logger.error(f"Failed to flush listings (will retry): {e}")
+            continue
+        if written:
+            _invalidate_stats_cache()
+            logger.debug(f"Flushed {written} listings")
 
 
 async def cleanup_job(context: ContextTypes.DEFAULT_TYPE):
     """Periodic job to clean up expired listings."""
-    deleted = cleanup_expired()
+    # The DELETE can take a while on a big table; keep it off the event loop
+    deleted = await asyncio.to_thread(cleanup_expired)
     if deleted > 0:
+        _invalidate_stats_cache()
         logger.info(f"Cleaned up {deleted} expired listings")
+    
+    # Keep the classification cache from carrying stale entries across days
+    evicted = await asyncio.to_thread(evict_cache)
+    if evicted > 0:
+        logger.info(f"Cleared {evicted} cached classifications")
 
 
 def main():
@@ -554,6 +883,18 @@ def main():
     # Create Telegram application
     app = Application.builder().token(BOT_TOKEN).build()
     
+    # ─── Group text message handler ──
+    # Registered first: group chatter is nearly all of the traffic, and its
+    # filter excludes commands, so it never shadows the handlers below.
+    # block=False: each message is handled in its own task, so a slow LLM call
+    # doesn't hold up commands or messages from other chats (and lets the
+    # classifier batch messages that arrive together)
+    app.add_handler(MessageHandler(
+        group_message_filter(),
+        handle_message,
+        block=False
+    ))
+    
     # ── Command handlers ──
     app.add_handler(CommandHandler("stats", stats_command))
     app.add_handler(CommandHandler("help", help_command))
@@ -561,12 +902,6 @@ def main():
     
     # ── Group membership handler ──
     app.add_handler(ChatMemberHandler(handle_bot_added, ChatMemberHandler.MY_CHAT_MEMBER))
-
-    # ─── Group text message handler ──
-    app.add_handler(MessageHandler(
-        filters.TEXT & ~filters.COMMAND & (filters.ChatType.GROUP | filters.ChatType.SUPERGROUP),
-        handle_message
-    ))
     
     # Schedule daily cleanup
     job_queue = app.job_queue
@@ -580,16 +915,39 @@ def main():
     logger.info(f"🚀 Bot starting with webhook server on port {WEBHOOK_PORT}...")
     
     # Run Telegram polling + aiohttp webhook server together
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     
     async def run_all():
-        """Run Telegram bot polling and aiohttp webhook server concurrently."""
+        """Run the Telegram bot (polling or webhook) and aiohttp webhook server together."""
+        # SQLite, Groq and Razorpay calls run in threads via asyncio.to_thread;
+        # size the pool so a burst of messages doesn't queue behind a few slow calls
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="bot-io")
+        )
         # Initialize Telegram app
         await app.initialize()
         await app.start()
-        await app.updater.start_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
-        logger.info("✅ Telegram polling started")
+        try:
+            await app.bot.set_my_commands(_BOT_COMMANDS)
+        except Exception as e:
+            logger.warning(f"Could not set bot commands: {e}")
+        # Webhook mode only with a secret: without one, anyone who finds the
+        # URL could post forged updates (fake listings, admin commands)
+        use_webhook = bool(TELEGRAM_WEBHOOK_URL)
+        if use_webhook and not TELEGRAM_WEBHOOK_SECRET:
+            logger.error("TELEGRAM_WEBHOOK_URL is set without TELEGRAM_WEBHOOK_SECRET; using polling instead")
+            use_webhook = False
+        if not use_webhook:
+            await app.updater.start_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+            logger.info("✅ Telegram polling started")
+        
+        # Not on the job queue: listings must be written even without it
+        flush_task = asyncio.create_task(flush_listings_loop())
+        link_pool_task = asyncio.create_task(link_pool_loop())
         
         # ─── aiohttp webhook server ──
         aio_app = web.Application()
@@ -609,7 +967,7 @@ def main():
                     logger.warning("Invalid Razorpay webhook signature")
                     return web.json_response({"error": "Invalid signature"}, status=400)
                 
-                payload = json.loads(body)
+                payload = _json_loads(body)
                 event = payload.get("event", "")
                 logger.info(f"Razorpay webhook received: {event}")
                 
@@ -623,24 +981,37 @@ def main():
                     
                     logger.info(f"Payment link {link_id} paid. Payment ID: {payment_id}")
                     
-                    # Look up the claim
-                    claim = get_payment_by_link_id(link_id)
-                    if not claim:
-                        logger.warning(f"No claim found for Razorpay link {link_id}")
-                        return web.json_response({"status": "no_claim"})
-                    
-                    if claim["status"] == "paid":
-                        logger.info(f"Claim #{claim['id']} already processed, skipping")
+                    if link_id in _delivered_link_ids:
+                        logger.info(f"Link {link_id} already delivered, skipping")
                         return web.json_response({"status": "already_processed"})
                     
-                    # Mark as paid
-                    update_payment_status(claim["id"], "paid", razorpay_payment_id=payment_id)
+                    # Claimed before the first await, so a retry arriving
+                    # mid-delivery is skipped too; released if delivery fails
+                    _mark_delivered(link_id)
+                    try:
+                        # Look up the claim and mark it paid in one statement
+                        claim, newly_paid = await asyncio.to_thread(
+                            mark_payment_paid_by_link, link_id, payment_id
+                        )
+                        if not claim:
+                            logger.warning(f"No claim found for Razorpay link {link_id}")
+                            _delivered_link_ids.pop(link_id, None)
+                            return web.json_response({"status": "no_claim"})
+                        
+                        if not newly_paid:
+                            logger.info(f"Claim #{claim['id']} already processed, skipping")
+                            return web.json_response({"status": "already_processed"})
+                        
+                    except Exception:
+                        _delivered_link_ids.pop(link_id, None)
+                        raise
                     
-                    # Deliver leads automatically
-                    await _deliver_leads(app.bot, claim)
+                    # Acknowledge now and deliver in the background, so Razorpay
+                    # doesn't time out and retry while Telegram sends are in flight
+                    _track_task(_deliver_leads_bounded(app.bot, claim))
                     
-                    logger.info(f"✅ Auto-delivered leads for claim #{claim['id']}")
-                    return web.json_response({"status": "delivered"})
+                    logger.info(f"✅ Queued lead delivery for claim #{claim['id']}")
+                    return web.json_response({"status": "accepted"})
                 
                 return web.json_response({"status": "ok"})
                 
@@ -648,8 +1019,28 @@ def main():
                 logger.error(f"Webhook error: {e}", exc_info=True)
                 return web.json_response({"error": str(e)}, status=500)
         
+        async def telegram_webhook(request):
+            """Receive a Telegram update pushed by the Bot API."""
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token, TELEGRAM_WEBHOOK_SECRET):
+                logger.warning("Invalid Telegram webhook secret")
+                return web.json_response({"error": "Invalid secret"}, status=403)
+            
+            try:
+                update = Update.de_json(await request.json(loads=_json_loads), app.bot)
+            except Exception as e:
+                logger.warning(f"Malformed Telegram update: {e}")
+                return web.json_response({"error": "Bad request"}, status=400)
+            if update is None:
+                return web.json_response({"error": "Bad request"}, status=400)
+            await app.update_queue.put(update)
+            return web.json_response({"status": "ok"})
+        
         aio_app.router.add_get("/", health_check)
         aio_app.router.add_post("/razorpay/webhook", razorpay_webhook)
+        if use_webhook:
+            telegram_path = urlparse(TELEGRAM_WEBHOOK_URL).path or "/"
+            aio_app.router.add_post(telegram_path, telegram_webhook)
         
         runner = web.AppRunner(aio_app)
         await runner.setup()
@@ -657,15 +1048,40 @@ def main():
         await site.start()
         logger.info(f"✅ Webhook server started on port {WEBHOOK_PORT}")
         
-        # Keep running until interrupted
+        if use_webhook:
+            # Telegram pushes updates to us; no getUpdates round-trips
+            await app.bot.set_webhook(
+                url=TELEGRAM_WEBHOOK_URL,
+                secret_token=TELEGRAM_WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True
+            )
+            logger.info(f"✅ Telegram webhook set: {TELEGRAM_WEBHOOK_URL}")
+        
+        # Keep running until SIGINT/SIGTERM (Render sends SIGTERM on redeploy)
+        stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C still raises KeyboardInterrupt
         try:
-            while True:
-                await asyncio.sleep(3600)
+            await stop_event.wait()
         except (KeyboardInterrupt, asyncio.CancelledError):
             pass
         finally:
             logger.info("Shutting down...")
-            await app.updater.stop()
+            flush_task.cancel()
+            link_pool_task.cancel()
+            # Unused pooled links would otherwise stay payable until they expire
+            await asyncio.to_thread(_cancel_pooled_links)
+            # Let in-flight lead deliveries finish; those claims are already marked paid
+            if _delivery_tasks:
+                await asyncio.gather(*_delivery_tasks, return_exceptions=True)
+            if _pending_sales:
+                await _send_admin_notices(app.bot)
+            if app.updater.running:
+                await app.updater.stop()
             await app.stop()
             await app.shutdown()
             await runner.cleanup()
@@ -674,6 +1090,12 @@ def main():
         loop.run_until_complete(run_all())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
+    finally:
+        # Don't lose listings still waiting in the write-behind buffer
+        written = flush_listings()
+        if written:
+            logger.info(f"Flushed {written} buffered listings on shutdown")
+        llm_classifier.close()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,61 @@
 """
 LLM-only message classifier using Groq API.
-No keyword fallback - relies entirely on LLM for classification.
+No keyword fallback - relies entirely on LLM for classification. Keywords
+are only used as a gate: messages with no listing vocabulary at all never
+reach the LLM.
 """
 
 import re
 import logging
 from typing import Optional
 
+from keywords import CATEGORY_KEYWORDS, INTENT_KEYWORDS
+
 logger = logging.getLogger(__name__)
 
+# One alternation over the whole listing vocabulary, compiled once. Letter
+# lookarounds instead of \b so "2bhk" matches and "ac" doesn't match "each";
+# optional "s"/"es" covers plurals.
+_vocabulary = {kw for words in CATEGORY_KEYWORDS.values() for kw in words} | set(INTENT_KEYWORDS)
+_LISTING_HINT_RE = re.compile(
+    r'(?<![a-z])(?:'
+    + '|'.join(re.escape(kw) for kw in sorted(_vocabulary, key=len, reverse=True))
+    + r')(?:e?s)?(?![a-z])',
+    re.IGNORECASE
+)
+
+# Ten digits, optionally separated — enough to say "has a phone number"
+_PHONE_HINT_RE = re.compile(r'(?:\d[-\s]?){10}')
+
+# Indian mobile number, optionally prefixed with 91 / +91; group 1 is the
+# 10-digit number
+_CONTACT_RE = re.compile(r'(?:\b|(?<=\+))(?:91\s*)?([6-9]\d{9})\b')
+
+# A letter in any script; messages without any (emoji, stickers-as-text,
+# bare numbers) are never listings
+_ALPHA_RE = re.compile(r'[^\W\d_]')
+# A letter outside ASCII: Devanagari, Kannada, Tamil, Bengali, ...
+_NON_LATIN_RE = re.compile(r'[^\W\d_a-zA-Z]')
+
+# Worth sending to the LLM: any non-Latin letter (the vocabulary is
+# Latin-script only), a phone number, or listing vocabulary — one scan
+_CLASSIFY_HINT_RE = re.compile(
+    '|'.join(f'(?:{p.pattern})' for p in (_NON_LATIN_RE, _PHONE_HINT_RE, _LISTING_HINT_RE)),
+    re.IGNORECASE
+)
+
+# Longer than any real listing; usually forwarded articles or rule posts
+MAX_MESSAGE_LENGTH = 4000
+
 # Try to import LLM classifier
 try:
-    from llm_classifier import llm_classifier, GROQ_AVAILABLE
+    from llm_classifier import llm_classifier, GROQ_AVAILABLE, ClassificationError
 except ImportError:
     llm_classifier = None
     GROQ_AVAILABLE = False
+    
+    class ClassificationError(Exception):
+        """No verdict from the LLM (see llm_classifier.ClassificationError)."""
 
 
 class MessageClassifier:
@@ -32,57 +73,72 @@ class MessageClassifier:
         """
         Classify message using LLM only.
         Returns dict with category, subcategory, listing_type, contact,
-        property_type, gender_preference, or None if irrelevant.
+        property_type, gender_preference, or None if irrelevant (or if
+        the LLM couldn't be reached).
         """
-        # Quick ignore check for very short messages
-        if self._should_ignore(text):
+        try:
+            return self.classify_batch([text])[0]
+        except ClassificationError:
             return None
+    
+    def classify_batch(self, texts: list) -> list:
+        """
+        Classify several messages, sending all relevant ones to the LLM in one call.
+        Returns one result (dict or None) per text, in input order. Raises
+        ClassificationError if the LLM gave no verdict, so callers that cache
+        results can tell a failure from "irrelevant".
+        """
+        results = [None] * len(texts)
+        
+        # Quick ignore check for very short messages
+        pending = [i for i, text in enumerate(texts) if not self._should_ignore(text)]
+        if not pending:
+            return results
         
         # Use LLM for classification
         if not self.use_llm:
             logger.warning("LLM not available, cannot classify message")
-            return None
+            raise ClassificationError("LLM not available")
         
-        result = llm_classifier.classify(text)
+        llm_results = llm_classifier.classify_batch([texts[i] for i in pending])
         
-        if not result:
-            # LLM returned None (irrelevant message)
-            logger.debug(f"Message ignored (irrelevant): {text[:50]}...")
-            return None
-        
-        # Ensure contact is extracted
-        if not result.get("contact"):
-            result["contact"] = self._extract_contact(text)
+        for i, result in zip(pending, llm_results):
+            text = texts[i]
+            if not result:
+                # LLM returned None (irrelevant message)
+                logger.debug("Message ignored (irrelevant): %.50s...", text)
+                continue
+            
+            # Ensure contact is extracted
+            if not result.get("contact"):
+                result["contact"] = self._extract_contact(text)
+            
+            logger.debug("LLM classified: %s", result)
+            results[i] = result
         
-        logger.debug(f"LLM classified: {result}")
-        return result
+        return results
     
     def _should_ignore(self, text: str) -> bool:
-        """Check if message should be ignored (too short)."""
+        """Check if message should be ignored (too short/long, no letters, or plainly not a listing)."""
         text = text.strip()
         
-        if len(text) < 5:
+        if len(text) < 5 or len(text) > MAX_MESSAGE_LENGTH:
+            return True
+        
+        if not _ALPHA_RE.search(text):
+            return True
+        
+        # No listing vocabulary and no phone number: chat, skip the LLM.
+        # The vocabulary is Latin-script only, so other scripts go through.
+        if not _CLASSIFY_HINT_RE.search(text):
             return True
         
         return False
     
     def _extract_contact(self, text: str) -> Optional[str]:
         """Extract phone number from text."""
-        patterns = [
-            r'\b[6-9]\d{9}\b',
-            r'\b\+91\s*[6-9]\d{9}\b',
-            r'\b91\s*[6-9]\d{9}\b',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                number = re.sub(r'\D', '', match.group())
-                if len(number) > 10:
-                    number = number[-10:]
-                return number
-        
-        return None
+        match = _CONTACT_RE.search(text)
+        return match.group(1) if match else None
 
 
 # Singleton instance
@@ -0,0 +1,288 @@
+"""
+Classification cache in front of the LLM classifier.
+Society groups see the same message re-posted many times (broker spam,
+"need maid" repeats); messages that only differ in case, spacing or
+punctuation — or only in the phone number ("call 98…" / "call 97…") —
+reuse the earlier classification instead of making another Groq call.
+The contact is never cached; it is re-read from each message. Entries
+are also kept in SQLite (classify_cache table) so the cache is still warm
+after a restart or redeploy, and expire after CACHE_TTL seconds. Only
+LLM verdicts are cached: messages the classifier's local gate drops
+(too short, no listing vocabulary) bypass the cache entirely.
+"""
+
+import re
+import json
+import asyncio
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from classifier import classifier, ClassificationError
+from database import (
+    get_cached_classification, save_classifications, prune_classify_cache, clear_classify_cache
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = 4096
+
+# Entries older than this are misses; evict_cache() deletes them
+CACHE_TTL = 24 * 3600
+
+# Micro-batching: cache misses arriving within BATCH_WINDOW seconds of each
+# other go to the LLM in one classify_batch call (at most BATCH_MAX_SIZE)
+BATCH_WINDOW = 0.05
+BATCH_MAX_SIZE = 32
+
+# LLM batches run on their own threads, so a slow Groq response can't take
+# every default-executor thread and stall the database calls queued behind it
+CLASSIFIER_WORKERS = 8
+_classifier_pool = ThreadPoolExecutor(max_workers=CLASSIFIER_WORKERS, thread_name_prefix="classify")
+
+# Phone-number-like digit runs (optional +, spaces/dashes between digits).
+# Only for masking the cache key: it also matches prices and other numbers,
+# so contacts are extracted with the classifier's own pattern.
+_PHONE_RE = re.compile(r'\+?\d(?:[\s-]?\d){7,}')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+# cache key -> (stored at, classification as JSON; "null" for messages
+# the LLM ignored). Serialized so a cached entry can never be mutated by a caller.
+# Written from classifier-pool threads and read on the event loop: only
+# touch it under _cache_lock.
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Bumped by clear_cache(). Results classified under an older generation are
+# returned to their callers but not cached, so a batch in flight during a
+# clear can't write stale verdicts back. _write_lock makes the generation
+# check and the write one step with respect to a clear.
+_cache_generation = 0
+_write_lock = threading.Lock()
+
+
+def normalize(text: str) -> str:
+    """Lowercased, punctuation stripped, whitespace collapsed."""
+    text = _PUNCT_RE.sub(' ', text.lower())
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def cache_key(text: str) -> str:
+    """Hash of the normalized text with phone numbers masked."""
+    masked = _PHONE_RE.sub(' phone ', text)
+    return hashlib.blake2b(normalize(masked).encode('utf-8'), digest_size=16).hexdigest()
+
+
+# (text, future) pairs waiting for the next batch flush
+_pending: list = []
+_flush_handle: Optional[asyncio.TimerHandle] = None
+_batch_tasks: set = set()  # Strong refs so running batches aren't GC'd
+
+
+def _remember(key: str, result_json: str, ts: float):
+    with _cache_lock:
+        _cache[key] = (ts, result_json)
+        _cache.move_to_end(key)
+        if len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _for_text(result_json: str, text: str) -> Optional[dict]:
+    """A cached result with the contact taken from this message."""
+    result = json.loads(result_json)
+    if result is not None:
+        # Same extractor as an uncached classification without an LLM contact
+        result["contact"] = classifier._extract_contact(text)
+    return result
+
+
+def _memory_lookup(key: str, text: str):
+    """Return (hit, result) from the in-memory cache only (no I/O)."""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return False, None
+        ts, cached = entry
+        if time.time() - ts >= CACHE_TTL:
+            del _cache[key]
+            return False, None
+        _cache.move_to_end(key)
+    return True, _for_text(cached, text)
+
+
+def _lookup(key: str, text: str, generation: int):
+    """Return (hit, result) for a message: memory first, then SQLite (blocks)."""
+    hit, result = _memory_lookup(key, text)
+    if hit:
+        return hit, result
+
+    try:
+        row = get_cached_classification(key, CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Classification cache read failed: {e}")
+        return False, None
+    if row is None:
+        return False, None
+    cached, ts = row
+    with _write_lock:
+        if generation == _cache_generation:
+            _remember(key, cached, ts)
+    return True, _for_text(cached, text)
+
+
+def _store(entries: list, generation: int):
+    """
+    Cache (key, result) pairs in memory and persist them, minus the contact.
+    Skipped if the cache was cleared since `generation` was read.
+    """
+    rows = []
+    for key, result in entries:
+        if result is not None:
+            result = {**result, "contact": None}
+        rows.append((key, json.dumps(result)))
+    with _write_lock:
+        if generation != _cache_generation:
+            return
+        now = time.time()
+        for key, result_json in rows:
+            _remember(key, result_json, now)
+        try:
+            save_classifications(rows)
+        except Exception as e:
+            logger.error(f"Classification cache write failed: {e}")
+
+
+def get_or_classify(text: str) -> Optional[dict]:
+    """Classify a message, reusing the result for text seen before."""
+    # Chit-chat never reaches the LLM; don't spend a cache entry on it
+    if classifier._should_ignore(text):
+        return None
+    key = cache_key(text)
+    generation = _cache_generation
+    hit, result = _lookup(key, text, generation)
+    if hit:
+        return result
+
+    # Classify the original text — the LLM still sees punctuation and casing
+    try:
+        result = classifier.classify_batch([text])[0]
+    except ClassificationError:
+        return None  # Not cached; a repost gets another chance
+    _store([(key, result)], generation)
+    return result
+
+
+async def classify_batched(text: str) -> Optional[dict]:
+    """
+    Async get_or_classify: cache misses are coalesced with other messages
+    arriving in the same short window and classified in one LLM call.
+    """
+    global _flush_handle
+    # Chit-chat never reaches the LLM; don't spend a cache entry on it
+    if classifier._should_ignore(text):
+        return None
+    # Memory only here; the SQLite lookup runs with the batch, off the loop
+    hit, result = _memory_lookup(cache_key(text), text)
+    if hit:
+        return result
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _pending.append((text, future))
+
+    if len(_pending) >= BATCH_MAX_SIZE:
+        _flush()
+    elif _flush_handle is None:
+        _flush_handle = loop.call_later(BATCH_WINDOW, _flush)
+
+    return await future
+
+
+def _flush():
+    """Send everything pending as one batch."""
+    global _pending, _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    batch, _pending = _pending, []
+    if batch:
+        task = asyncio.get_running_loop().create_task(_run_batch(batch, _cache_generation))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+
+
+def _classify_and_store(texts: list, generation: int) -> list:
+    """Results for texts: persisted cache hits, the rest from one LLM batch."""
+    keys = [cache_key(text) for text in texts]
+    results = [None] * len(texts)
+    misses = []
+    for i, (key, text) in enumerate(zip(keys, texts)):
+        hit, results[i] = _lookup(key, text, generation)
+        if not hit:
+            misses.append(i)
+    if not misses:
+        return results
+
+    classified = classifier.classify_batch([texts[i] for i in misses])
+    _store([(keys[i], result) for i, result in zip(misses, classified)], generation)
+    for i, result in zip(misses, classified):
+        results[i] = result
+    return results
+
+
+async def _run_batch(batch: list, generation: int):
+    texts = [text for text, _ in batch]
+    try:
+        # The cache read, LLM call and cache write all block — keep them off the event loop
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(_classifier_pool, _classify_and_store, texts, generation)
+    except Exception as e:
+        # Don't cache failures; a repost gets another chance
+        logger.error(f"Batch classification failed: {e}")
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+        return
+
+    for (_, future), result in zip(batch, results):
+        if not future.done():
+            future.set_result(result)
+
+
+def evict_cache() -> int:
+    """
+    Drop in-memory entries and persisted ones older than CACHE_TTL.
+    Returns the number of entries removed.
+    """
+    with _cache_lock:
+        count = len(_cache)
+        _cache.clear()
+    try:
+        count += prune_classify_cache(CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Classification cache prune failed: {e}")
+    return count
+
+
+def clear_cache() -> int:
+    """
+    Forget every cached classification, in memory and in SQLite (e.g. after
+    a prompt change); batches already in flight don't write theirs back.
+    Returns the number of persisted entries removed (the in-memory ones
+    are mostly copies of those).
+    """
+    global _cache_generation
+    with _write_lock:
+        _cache_generation += 1
+        with _cache_lock:
+            _cache.clear()
+        try:
+            return clear_classify_cache()
+        except Exception as e:
+            logger.error(f"Classification cache clear failed: {e}")
+            return 0
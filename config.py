@@ -11,12 +11,18 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 # Bot username (without @, needed for deep links)
 BOT_USERNAME = os.getenv("BOT_USERNAME", "societykakubot")
 
-# Database path
+# Database path (":memory:" or a "file:" URI gives a throwaway DB for tests)
 DATABASE_PATH = os.getenv("DATABASE_PATH", "housing_bot.db")
 
 # Listing expiry in days
 LISTING_EXPIRY_DAYS = int(os.getenv("LISTING_EXPIRY_DAYS", "180"))
 
+# Seconds between write-behind flushes of new listings to the database
+LISTING_FLUSH_INTERVAL = float(os.getenv("LISTING_FLUSH_INTERVAL", "2"))
+
+# Flush early once this many listings are waiting (bursts of messages)
+LISTING_FLUSH_BATCH = int(os.getenv("LISTING_FLUSH_BATCH", "50"))
+
 # Maximum results to show per query
 MAX_RESULTS = 10
 
@@ -31,6 +37,13 @@ RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET", "")
 # Public URL for Razorpay webhook callbacks (your Render web service URL)
 WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
 
+# Telegram webhook: when set (e.g. https://your-app.onrender.com/telegram/webhook),
+# Telegram pushes updates to this URL on the webhook server instead of the bot
+# long-polling getUpdates. Leave empty to use polling. Requires
+# TELEGRAM_WEBHOOK_SECRET (checked on every request); without it the bot polls.
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+
 # Pricing (in Rupees)
 TIER1_PRICE = int(os.getenv("TIER1_PRICE", "5"))
 TIER1_LEADS = 5
@@ -43,7 +56,7 @@ WEBHOOK_PORT = int(os.getenv("PORT", "10000"))
 
 # Allowed chat IDs (comma-separated). If empty, bot works in all groups.
 _allowed_ids = os.getenv("ALLOWED_CHAT_IDS", "")
-ALLOWED_CHAT_IDS = set(
+ALLOWED_CHAT_IDS = frozenset(
     int(cid.strip()) for cid in _allowed_ids.split(",") if cid.strip()
 )
 
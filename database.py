@@ -1,17 +1,41 @@
 import sqlite3
 import os
 import logging
-from datetime import datetime, timedelta
+import functools
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from config import DATABASE_PATH, LISTING_EXPIRY_DAYS
 
 
 logger = logging.getLogger(__name__)
 
-def get_connection():
-    """Get database connection with row factory."""
+# A shared-cache in-memory DB is dropped when its last connection closes, so
+# hold one open for the life of the process (see get_connection).
+_memory_db_keepalive = None
+
+
+# Bytes of the DB file to memory-map per connection (the DB is far smaller)
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def _open_connection(factory=sqlite3.Connection) -> sqlite3.Connection:
+    """Open a new database connection with row factory and per-connection pragmas."""
+    global _memory_db_keepalive
     path = DATABASE_PATH
     
+    # ":memory:" would give every call its own empty DB — share one instead
+    if path == ":memory:":
+        path = "file::memory:?cache=shared"
+    if path.startswith("file:"):
+        if _memory_db_keepalive is None and "memory" in path:
+            _memory_db_keepalive = sqlite3.connect(path, uri=True, check_same_thread=False)
+        conn = sqlite3.connect(path, uri=True, factory=factory)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
     # Auto-create directory if it doesn't exist
     db_dir = os.path.dirname(path)
     if db_dir:
@@ -23,19 +47,71 @@ def get_connection():
             path = os.path.basename(DATABASE_PATH)
     
     try:
-        conn = sqlite3.connect(path)
+        conn = sqlite3.connect(path, factory=factory)
         # Verify connectivity
         conn.execute("SELECT 1")
     except sqlite3.OperationalError as e:
         logger.error(f"Failed to open database at {path}: {e}. Trying local fallback.")
         path = "housing_bot.backup.db"
-        conn = sqlite3.connect(path)
+        conn = sqlite3.connect(path, factory=factory)
 
     logger.info(f"Using database at: {os.path.abspath(path)}")
     conn.row_factory = sqlite3.Row
+    # Safe under WAL (enabled in init_db) and avoids an fsync on every commit
+    conn.execute("PRAGMA synchronous = NORMAL")
+    # Read pages straight from the OS page cache instead of copying them in,
+    # and keep sort/window temp b-trees (lead dedup, ORDER BY) in memory
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
 
+class _ThreadConnection(sqlite3.Connection):
+    """
+    A connection kept open for the life of its thread. Helpers still call
+    close() when done; that only ends a transaction left open.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+
+# One connection per thread (event loop, executor workers), reused across
+# calls: no reconnect and pragma setup per query, and sqlite3's per-connection
+# statement cache keeps the helpers' queries prepared.
+_thread_local = threading.local()
+
+
+def get_connection():
+    """Get this thread's database connection (opened on first use, with row factory)."""
+    conn = getattr(_thread_local, "conn", None)
+    if conn is None:
+        conn = _open_connection(factory=_ThreadConnection)
+        _thread_local.conn = conn
+    elif conn.in_transaction:
+        # A previous call on this thread failed before committing
+        conn.rollback()
+    return conn
+
+
+def get_read_connection():
+    """Get a read-only connection for diagnostics; accidental writes fail fast."""
+    # Its own connection: query_only must not stick to the thread's shared one
+    conn = _open_connection()
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+@functools.lru_cache(maxsize=32)
+def get_columns(table: str) -> tuple:
+    """Column names of a table. Cached: the schema only changes in init_db."""
+    conn = get_read_connection()
+    columns = tuple(row[1] for row in conn.execute(f"PRAGMA table_info({table})"))
+    conn.close()
+    return columns
+
+
 def init_db():
     """Initialize the database schema."""
     try:
@@ -45,6 +121,10 @@ def init_db():
         logger.error(f"Critical error initializing database: {e}")
         raise e
     
+    # WAL lets readers (diagnostics, /stats) run alongside the bot's writer.
+    # The mode is stored in the DB file, so setting it once here is enough.
+    cursor.execute("PRAGMA journal_mode = WAL")
+    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS listings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -60,6 +140,7 @@ def init_db():
             message TEXT NOT NULL,
             property_type TEXT,
             gender_preference TEXT,
+            short_detail TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             expires_at TIMESTAMP
         )
@@ -77,6 +158,7 @@ def init_db():
             listing_type TEXT DEFAULT 'query',
             source_chat_id INTEGER,
             free_leads_sent INTEGER DEFAULT 0,
+            matches_snapshotted INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
@@ -91,12 +173,35 @@ def init_db():
             tier TEXT DEFAULT 't1',
             razorpay_link_id TEXT,
             razorpay_payment_id TEXT,
+            razorpay_reference_id TEXT,
             status TEXT DEFAULT 'created',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (request_id) REFERENCES lead_requests(id)
         )
     """)
     
+    # Listings matched to a lead request, ranked, captured on its first
+    # "Get Leads" so later views and paid delivery are keyed lookups, and the
+    # contacts a user pays for are the ones counted in their preview
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lead_request_matches (
+            request_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            listing_id INTEGER NOT NULL,
+            PRIMARY KEY (request_id, rank)
+        ) WITHOUT ROWID
+    """)
+    
+    # Classification cache — LLM results keyed by a hash of the normalized
+    # message text, so repeats stay cheap across restarts (classifier_cache.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS classify_cache (
+            text_hash TEXT PRIMARY KEY,
+            result TEXT,
+            ts INTEGER NOT NULL
+        )
+    """)
+    
     # Add new columns to existing tables (for migration)
     try:
         cursor.execute("ALTER TABLE listings ADD COLUMN property_type TEXT")
@@ -107,6 +212,12 @@ def init_db():
         cursor.execute("ALTER TABLE listings ADD COLUMN gender_preference TEXT")
     except sqlite3.OperationalError:
         pass  # Column already exists
+    
+    try:
+        # LLM summary captured at classification time, reused in lead cards
+        cursor.execute("ALTER TABLE listings ADD COLUMN short_detail TEXT")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
 
     try:
         cursor.execute("ALTER TABLE lead_requests ADD COLUMN listing_type TEXT DEFAULT 'query'")
@@ -118,6 +229,16 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # Column already exists
 
+    try:
+        cursor.execute("ALTER TABLE lead_requests ADD COLUMN matches_snapshotted INTEGER DEFAULT 0")
+        # Requests snapshotted when they were saved keep their snapshot
+        cursor.execute("""
+            UPDATE lead_requests SET matches_snapshotted = 1
+            WHERE id IN (SELECT DISTINCT request_id FROM lead_request_matches)
+        """)
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
     # Razorpay migration columns
     try:
         cursor.execute("ALTER TABLE payment_claims ADD COLUMN tier TEXT DEFAULT 't1'")
@@ -131,9 +252,12 @@ def init_db():
         cursor.execute("ALTER TABLE payment_claims ADD COLUMN razorpay_payment_id TEXT")
     except sqlite3.OperationalError:
         pass
+    try:
+        cursor.execute("ALTER TABLE payment_claims ADD COLUMN razorpay_reference_id TEXT")
+    except sqlite3.OperationalError:
+        pass
     
     # Create indexes for faster queries
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_category ON listings(category)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_listing_type ON listings(listing_type)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_expires_at ON listings(expires_at)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON listings(created_at)")
@@ -141,9 +265,39 @@ def init_db():
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_gender_preference ON listings(gender_preference)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_lead_req_user ON lead_requests(user_id)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_razorpay_link ON payment_claims(razorpay_link_id)")
+    # Match stats/samples: equality on category/type, range on expiry. The
+    # trailing columns make the hook's COUNT an index-only scan when there's
+    # no subcategory (which needs the message text anyway).
+    cursor.execute("DROP INDEX IF EXISTS idx_listings_match")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_listings_match_cover
+        ON listings(category, listing_type, expires_at, property_type, gender_preference, created_at)
+    """)
+    # Its (category) prefix serves every category lookup
+    cursor.execute("DROP INDEX IF EXISTS idx_category")
+    # Lead lookup: filter by category/type, partition by contact, newest first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_listings_dedup
+        ON listings(category, listing_type, contact, created_at DESC)
+    """)
     
     conn.commit()
+    
+    # Refresh planner statistics so new indexes get picked up
+    cursor.execute("PRAGMA optimize")
     conn.close()
+    
+    # Migrations above may have added columns
+    get_columns.cache_clear()
+
+
+_INSERT_LISTING_SQL = """
+    INSERT INTO listings 
+    (user_id, username, first_name, message_id, chat_id, category, 
+     subcategory, listing_type, contact, message, property_type, 
+     gender_preference, short_detail, expires_at, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+"""
 
 
 def add_listing(
@@ -158,23 +312,23 @@ def add_listing(
     contact: Optional[str],
     message: str,
     property_type: Optional[str] = None,
-    gender_preference: Optional[str] = None
+    gender_preference: Optional[str] = None,
+    created_at: Optional[str] = None,
+    short_detail: Optional[str] = None
 ) -> int:
-    """Add a new listing to the database."""
+    """
+    Add a new listing to the database.
+    created_at defaults to the current time; pass it explicitly
+    (e.g. "2024-01-01 00:00:01") for deterministic ordering in tests.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
     
     expires_at = datetime.now() + timedelta(days=LISTING_EXPIRY_DAYS)
     
-    cursor.execute("""
-        INSERT INTO listings 
-        (user_id, username, first_name, message_id, chat_id, category, 
-         subcategory, listing_type, contact, message, property_type, 
-         gender_preference, expires_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (user_id, username, first_name, message_id, chat_id, category,
-          subcategory, listing_type, contact, message, property_type,
-          gender_preference, expires_at))
+    cursor = conn.execute(_INSERT_LISTING_SQL, (
+        user_id, username, first_name, message_id, chat_id, category,
+        subcategory, listing_type, contact, message, property_type,
+        gender_preference, short_detail, expires_at, created_at))
     
     listing_id = cursor.lastrowid
     conn.commit()
@@ -183,9 +337,154 @@ def add_listing(
     return listing_id
 
 
+def add_listings_bulk(rows: list) -> int:
+    """
+    Insert many listings in a single transaction (one commit for the batch).
+    Each row is a dict of add_listing() keyword arguments.
+    Returns the number of rows inserted.
+    """
+    if not rows:
+        return 0
+    
+    expires_at = datetime.now() + timedelta(days=LISTING_EXPIRY_DAYS)
+    params = [
+        (row["user_id"], row.get("username"), row.get("first_name"),
+         row.get("message_id"), row.get("chat_id"), row["category"],
+         row.get("subcategory"), row["listing_type"], row.get("contact"),
+         row["message"], row.get("property_type"), row.get("gender_preference"),
+         row.get("short_detail"), expires_at, row.get("created_at"))
+        for row in rows
+    ]
+    
+    conn = get_connection()
+    conn.isolation_level = "IMMEDIATE"  # Take the write lock up front
+    try:
+        with conn:
+            cursor = conn.executemany(_INSERT_LISTING_SQL, params)
+    finally:
+        conn.isolation_level = ""  # Back to the default for the thread's other calls
+    conn.close()
+    
+    return cursor.rowcount
+
+
+# ─── Write-behind Listing Buffer ──────────────────────────────
+
+# Listings from group messages are buffered here and written in one
+# transaction by flush_listings(), keeping the insert off the message path.
+_pending_listings: list = []
+_pending_lock = threading.Lock()
+
+
+def queue_listing(**listing) -> int:
+    """
+    Buffer a listing (add_listing() keyword arguments) for the next
+    flush_listings(). Returns the number of listings now waiting.
+    """
+    # Stamp the post time now, not at flush time (UTC, like CURRENT_TIMESTAMP)
+    listing.setdefault("created_at", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+    with _pending_lock:
+        _pending_listings.append(listing)
+        return len(_pending_listings)
+
+
+# Flushes a listing may fail transiently (database locked, disk full) before
+# it is dropped, so a stuck batch can't grow the buffer forever
+LISTING_FLUSH_MAX_ATTEMPTS = 5
+
+
+def flush_listings() -> int:
+    """
+    Write all buffered listings in one transaction. Returns rows written.
+    A batch rejected for its data is retried row by row, and rows that
+    still fail are logged and dropped; transient failures are retried on
+    the next flush (up to LISTING_FLUSH_MAX_ATTEMPTS) and re-raised.
+    """
+    global _pending_listings
+    with _pending_lock:
+        batch, _pending_listings = _pending_listings, []
+    if not batch:
+        return 0
+    
+    try:
+        return add_listings_bulk(batch)
+    except sqlite3.OperationalError:
+        retry = []
+        for row in batch:
+            row["_flush_attempts"] = row.get("_flush_attempts", 0) + 1
+            if row["_flush_attempts"] < LISTING_FLUSH_MAX_ATTEMPTS:
+                retry.append(row)
+        if len(retry) < len(batch):
+            logger.error(f"Dropping {len(batch) - len(retry)} listings after {LISTING_FLUSH_MAX_ATTEMPTS} failed flushes")
+        # Put them back (ahead of newer ones) for the next flush
+        with _pending_lock:
+            _pending_listings[:0] = retry
+        raise
+    except Exception as e:
+        # One bad row fails the whole executemany; write the rest one by one
+        logger.warning(f"Listing batch rejected ({e}); inserting rows individually")
+    
+    written = 0
+    for row in batch:
+        try:
+            written += add_listings_bulk([row])
+        except Exception as e:
+            logger.error(f"Dropping listing that can't be stored ({e}): {str(row.get('message'))[:50]!r}")
+    return written
+
+
 # ─── Lead Requests ────────────────────────────────────────────
 
 
+# Matches captured per lead request (more than any tier can deliver)
+LEAD_SNAPSHOT_LIMIT = 100
+
+
+def _lead_matches_query(req: dict) -> tuple:
+    """
+    SQL (and params) selecting the listings that answer a lead request,
+    newest per contact. Shows the OPPOSITE type: query → offers, offer → queries.
+    """
+    search_type = "offer" if (req.get("listing_type") or "query") == "query" else "query"
+    
+    where = """
+        WHERE category = ? 
+        AND listing_type = ?
+        AND expires_at > ?
+        AND contact IS NOT NULL
+        AND contact != ''
+    """
+    params = [req["category"], search_type, datetime.now()]
+    
+    if req["subcategory"]:
+        where += " AND (subcategory LIKE ? OR message LIKE ?)"
+        params.extend([f"%{req['subcategory']}%", f"%{req['subcategory']}%"])
+    
+    # Relaxed filters: match exact OR NULL (old listings without these fields)
+    if req["property_type"]:
+        where += " AND (property_type = ? OR property_type IS NULL)"
+        params.append(req["property_type"])
+    
+    if req["gender_preference"]:
+        where += " AND (gender_preference = ? OR gender_preference IS NULL)"
+        params.append(req["gender_preference"])
+    
+    # Keep only the newest listing per contact info (phone num) or user_id
+    # if phone is missing, so we don't show the same person twice
+    sql = f"""
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY COALESCE(contact, user_id)
+                ORDER BY created_at DESC, id DESC
+            ) AS rn
+            FROM listings
+            {where}
+        )
+        WHERE rn = 1
+    """
+    return sql, params
+
+
 def save_lead_request(
     user_id: int,
     category: str,
@@ -197,92 +496,128 @@ def save_lead_request(
 ) -> int:
     """Save a lead request and return its ID (used in deep link encoding)."""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("""
+    cursor = conn.execute("""
         INSERT INTO lead_requests 
         (user_id, category, subcategory, property_type, gender_preference, listing_type, source_chat_id)
         VALUES (?, ?, ?, ?, ?, ?, ?)
     """, (user_id, category, subcategory, property_type, gender_preference, listing_type, source_chat_id))
     
     request_id = cursor.lastrowid
+    # Matches are snapshotted on the first "Get Leads" (most hooks are never
+    # clicked), see _snapshot_lead_matches
     conn.commit()
     conn.close()
     
     return request_id
 
 
+# Lead requests never change once saved, and one DM flow reads the same
+# one several times (deep link, leads, payment); keep recent ones in memory
+LEAD_REQUEST_CACHE_MAX = 10000
+LEAD_REQUEST_CACHE_TTL = 3600
+_lead_request_cache: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (ts, row)
+_lead_request_lock = threading.Lock()
+
+
+def _load_lead_request(conn, request_id: int) -> Optional[dict]:
+    """Lead request by ID from the cache, else from `conn`. Returns a copy."""
+    now = time.monotonic()
+    with _lead_request_lock:
+        entry = _lead_request_cache.get(request_id)
+        if entry is not None and now - entry[0] < LEAD_REQUEST_CACHE_TTL:
+            _lead_request_cache.move_to_end(request_id)
+            return dict(entry[1])
+    
+    row = conn.execute("SELECT * FROM lead_requests WHERE id = ?", (request_id,)).fetchone()
+    if not row:
+        return None  # Not cached: the ID may not have been saved yet
+    req = dict(row)
+    with _lead_request_lock:
+        _lead_request_cache[request_id] = (now, req)
+        _lead_request_cache.move_to_end(request_id)
+        if len(_lead_request_cache) > LEAD_REQUEST_CACHE_MAX:
+            _lead_request_cache.popitem(last=False)
+    return dict(req)
+
+
 def get_lead_request(request_id: int) -> Optional[dict]:
     """Retrieve a lead request by ID."""
     conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM lead_requests WHERE id = ?", (request_id,))
-    row = cursor.fetchone()
+    req = _load_lead_request(conn, request_id)
     conn.close()
-    
-    if row:
-        return dict(row)
-    return None
+    return req
+
+
+def _snapshot_lead_matches(conn, req: dict):
+    """
+    Record the ranked matches for a lead request (up to LEAD_SNAPSHOT_LIMIT)
+    and mark it snapshotted, freezing it at its first view with matches.
+    A view that finds nothing (matching listings may still be in the
+    write-behind buffer) leaves it unmarked, so the next view tries again.
+    Concurrent first views insert the same ranks; OR IGNORE keeps the first.
+    """
+    matches_sql, params = _lead_matches_query(req)
+    cursor = conn.execute(f"""
+        INSERT OR IGNORE INTO lead_request_matches (request_id, rank, listing_id)
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY created_at DESC, id DESC), id
+        FROM ({matches_sql})
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, [req["id"], *params, LEAD_SNAPSHOT_LIMIT])
+    if cursor.rowcount > 0:
+        conn.execute("UPDATE lead_requests SET matches_snapshotted = 1 WHERE id = ?", (req["id"],))
+    conn.commit()
 
 
 def get_leads_for_request(
     request_id: int,
     limit: int = 5,
-    offset: int = 0
-) -> list:
+    offset: int = 0,
+    with_count: bool = False
+):
     """
     Fetch matching listings for a stored lead request.
     Cross-group: no chat_id filter — shows from all groups.
     If user posted a query → find offers. If user posted an offer → find queries.
     Uses offset to skip already-shown free leads.
     Refined: Groups by contact/user_id to prevent duplicates.
+    The first call snapshots the matches; later calls (paid delivery) page
+    through that same set.
+    With with_count=True, returns (leads, total matching leads) from the same query.
     """
-    req = get_lead_request(request_id)
-    if not req:
-        return []
-    
     conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Show the OPPOSITE type: query → offers, offer → queries
-    search_type = "offer" if req.get("listing_type", "query") == "query" else "query"
-    
-    query = """
-        SELECT * FROM listings 
-        WHERE category = ? 
-        AND listing_type = ?
-        AND expires_at > ?
-        AND contact IS NOT NULL
-        AND contact != ''
-    """
-    params = [req["category"], search_type, datetime.now()]
     
-    if req["subcategory"]:
-        query += " AND (subcategory LIKE ? OR message LIKE ?)"
-        params.extend([f"%{req['subcategory']}%", f"%{req['subcategory']}%"])
-    
-    # Relaxed filters: match exact OR NULL (old listings without these fields)
-    if req["property_type"]:
-        query += " AND (property_type = ? OR property_type IS NULL)"
-        params.append(req["property_type"])
-    
-    if req["gender_preference"]:
-        query += " AND (gender_preference = ? OR gender_preference IS NULL)"
-        params.append(req["gender_preference"])
-    
-    # Group by contact info (phone num) or user_id if phone is missing
-    # to ensure we don't show the same person twice
-    query += " GROUP BY COALESCE(contact, user_id)"
-    
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
-    
-    cursor.execute(query, params)
-    results = cursor.fetchall()
+    # Load the request (usually cached) on the same connection
+    req = _load_lead_request(conn, request_id)
+    if not req:
+        conn.close()
+        return ([], 0) if with_count else []
+    
+    # Not from the cached request: the flag changes on the first view
+    snapshotted = conn.execute(
+        "SELECT matches_snapshotted FROM lead_requests WHERE id = ?", (request_id,)
+    ).fetchone()[0]
+    if not snapshotted:
+        _snapshot_lead_matches(conn, req)
+    
+    # COUNT(*) OVER () is computed before LIMIT, so it's the full total.
+    # The join drops listings removed by cleanup since the snapshot.
+    results = conn.execute("""
+        SELECT l.*, COUNT(*) OVER () AS total
+        FROM lead_request_matches m
+        JOIN listings l ON l.id = m.listing_id
+        WHERE m.request_id = ? AND l.expires_at > ?
+        ORDER BY m.rank
+        LIMIT ? OFFSET ?
+    """, (request_id, datetime.now(), limit, offset)).fetchall()
     conn.close()
     
-    return [dict(row) for row in results]
+    leads = [dict(row) for row in results]
+    total = leads[0]["total"] if leads else 0
+    for lead in leads:
+        del lead["total"]
+    return (leads, total) if with_count else leads
 
 
 # ─── Payments (Razorpay) ──────────────────────────────────────
@@ -293,16 +628,17 @@ def save_payment_claim(
     request_id: int,
     amount: int,
     tier: str,
-    razorpay_link_id: str = ""
+    razorpay_link_id: str = "",
+    razorpay_reference_id: str = ""
 ) -> int:
-    """Save a new payment claim with Razorpay link ID."""
+    """Save a new payment claim with Razorpay link ID (and our reference_id for the link)."""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO payment_claims (user_id, request_id, amount, tier, razorpay_link_id, status)
-        VALUES (?, ?, ?, ?, ?, 'created')
-    """, (user_id, request_id, amount, tier, razorpay_link_id))
+    cursor = conn.execute("""
+        INSERT INTO payment_claims
+        (user_id, request_id, amount, tier, razorpay_link_id, razorpay_reference_id, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'created')
+    """, (user_id, request_id, amount, tier, razorpay_link_id, razorpay_reference_id))
     
     claim_id = cursor.lastrowid
     conn.commit()
@@ -313,10 +649,8 @@ def save_payment_claim(
 def get_payment_claim(claim_id: int) -> Optional[dict]:
     """Get payment claim details."""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM payment_claims WHERE id = ?", (claim_id,))
-    row = cursor.fetchone()
+    row = conn.execute("SELECT * FROM payment_claims WHERE id = ?", (claim_id,)).fetchone()
     conn.close()
     
     return dict(row) if row else None
@@ -325,10 +659,9 @@ def get_payment_claim(claim_id: int) -> Optional[dict]:
 def get_payment_by_link_id(razorpay_link_id: str) -> Optional[dict]:
     """Look up a payment claim by Razorpay Payment Link ID (for webhook)."""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM payment_claims WHERE razorpay_link_id = ?", (razorpay_link_id,))
-    row = cursor.fetchone()
+    row = conn.execute(
+        "SELECT * FROM payment_claims WHERE razorpay_link_id = ?", (razorpay_link_id,)).fetchone()
     conn.close()
     
     return dict(row) if row else None
@@ -337,14 +670,13 @@ def get_payment_by_link_id(razorpay_link_id: str) -> Optional[dict]:
 def update_payment_status(claim_id: int, status: str, razorpay_payment_id: str = ""):
     """Update payment claim status and optionally store Razorpay payment ID."""
     conn = get_connection()
-    cursor = conn.cursor()
     
     if razorpay_payment_id:
-        cursor.execute(
+        conn.execute(
             "UPDATE payment_claims SET status = ?, razorpay_payment_id = ? WHERE id = ?", 
             (status, razorpay_payment_id, claim_id))
     else:
-        cursor.execute(
+        conn.execute(
             "UPDATE payment_claims SET status = ? WHERE id = ?", 
             (status, claim_id))
         
@@ -352,197 +684,107 @@ def update_payment_status(claim_id: int, status: str, razorpay_payment_id: str =
     conn.close()
 
 
-# ─── Matching (existing, updated for cross-group) ────────────
-
-
-def get_matching_listings(
-    category: str,
-    subcategory: Optional[str] = None,
-    property_type: Optional[str] = None,
-    gender_preference: Optional[str] = None,
-    chat_id: Optional[int] = None,
-    limit: int = 5
-) -> list:
+def mark_payment_paid_by_link(razorpay_link_id: str, razorpay_payment_id: str = "") -> tuple:
     """
-    Get listings matching a query.
-    Returns offers when someone is looking for something.
-    Sorted by most recent first.
+    Mark the claim for a Razorpay link paid, unless it already is (webhook).
+    One conditional UPDATE ... RETURNING, so two deliveries of the same event
+    can't both see it unpaid. Returns (claim, newly_paid); claim is None if
+    no claim uses the link.
     """
     conn = get_connection()
-    cursor = conn.cursor()
     
-    # Clean up expired listings first
-    cursor.execute("DELETE FROM listings WHERE expires_at < ?", (datetime.now(),))
+    row = conn.execute("""
+        UPDATE payment_claims
+        SET status = 'paid', razorpay_payment_id = COALESCE(NULLIF(?, ''), razorpay_payment_id)
+        WHERE razorpay_link_id = ? AND status != 'paid'
+        RETURNING *
+    """, (razorpay_payment_id, razorpay_link_id)).fetchone()
     conn.commit()
     
-    # Build dynamic query with filters — NO chat_id filter for cross-group
-    query = """
-        SELECT * FROM listings 
-        WHERE category = ? 
-        AND listing_type = 'offer'
-        AND expires_at > ?
-    """
-    params = [category, datetime.now()]
-    
-    # Add subcategory filter if specified
-    if subcategory:
-        query += " AND (subcategory LIKE ? OR message LIKE ?)"
-        params.extend([f"%{subcategory}%", f"%{subcategory}%"])
-    
-    # Add property_type filter if specified (exact match when specified)
-    if property_type:
-        query += " AND property_type = ?"
-        params.append(property_type)
-    
-    # Add gender_preference filter if specified (exact match when specified)
-    if gender_preference:
-        query += " AND gender_preference = ?"
-        params.append(gender_preference)
+    if row is not None:
+        conn.close()
+        return dict(row), True
     
-    query += " ORDER BY created_at DESC LIMIT ?"
-    params.append(limit)
-    
-    cursor.execute(query, params)
-    
-    results = cursor.fetchall()
+    # Not updated: either already paid (a retry) or an unknown link
+    row = conn.execute(
+        "SELECT * FROM payment_claims WHERE razorpay_link_id = ?", (razorpay_link_id,)).fetchone()
     conn.close()
-    
-    return [dict(row) for row in results]
+    return (dict(row) if row else None), False
+
+
+# ─── Matching (existing, updated for cross-group) ────────────
 
 
-def get_matching_queries(
+def _match_filter(
     category: str,
-    subcategory: Optional[str] = None,
-    property_type: Optional[str] = None,
-    gender_preference: Optional[str] = None,
-    chat_id: Optional[int] = None,
-    limit: int = 5
-) -> list:
-    """
-    Get queries (buyers) matching an offer.
-    Returns people who are looking for something.
-    Sorted by most recent first.
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Build dynamic query — NO chat_id filter for cross-group
-    query = """
-        SELECT * FROM listings 
-        WHERE category = ? 
-        AND listing_type = 'query'
+    listing_type: str,
+    subcategory: Optional[str],
+    property_type: Optional[str],
+    gender_preference: Optional[str],
+) -> tuple:
+    """WHERE clause and params for unexpired listings matching a request."""
+    # NO chat_id filter — matching is cross-group
+    where = """
+        WHERE category = ?
+        AND listing_type = ?
         AND expires_at > ?
     """
-    params = [category, datetime.now()]
-    
-    # Add subcategory filter if specified
+    params = [category, listing_type, datetime.now()]
+
     if subcategory:
-        query += " AND (subcategory LIKE ? OR message LIKE ?)"
+        where += " AND (subcategory LIKE ? OR message LIKE ?)"
         params.extend([f"%{subcategory}%", f"%{subcategory}%"])
-    
-    # Add property_type filter if specified (exact match)
     if property_type:
-        query += " AND property_type = ?"
+        where += " AND property_type = ?"
         params.append(property_type)
-    
-    # Add gender_preference filter if specified (exact match)
     if gender_preference:
-        query += " AND gender_preference = ?"
+        where += " AND gender_preference = ?"
         params.append(gender_preference)
-    
-    query += " ORDER BY created_at DESC LIMIT ?"
-    params.append(limit)
-    
-    cursor.execute(query, params)
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    return [dict(row) for row in results]
+    return where, params
 
 
-def get_recent_listings(category: Optional[str] = None, limit: int = 10) -> list:
-    """Get recent listings, optionally filtered by category."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if category:
-        cursor.execute("""
-            SELECT * FROM listings 
-            WHERE category = ? AND expires_at > ?
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (category, datetime.now(), limit))
-    else:
-        cursor.execute("""
-            SELECT * FROM listings 
-            WHERE expires_at > ?
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (datetime.now(), limit))
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    return [dict(row) for row in results]
-
+def _query_match_stats(conn, where: str, params: list) -> dict:
+    # Total and last-7-days count in one pass
+    row = conn.execute(
+        f"SELECT COUNT(*) as total, COALESCE(SUM(created_at > ?), 0) as recent_7d FROM listings {where}",
+        [datetime.now() - timedelta(days=7)] + params
+    ).fetchone()
+    return {"total": row["total"], "recent_7d": row["recent_7d"]}
 
 
-def get_match_stats(
+def get_match_stats_and_sample(
     category: str,
     listing_type: str = "offer",
     subcategory: Optional[str] = None,
     property_type: Optional[str] = None,
     gender_preference: Optional[str] = None,
-    chat_id: Optional[int] = None,
-) -> dict:
+    limit: int = 10,
+) -> tuple:
     """
-    Get aggregate stats for matching listings/queries.
-    Returns total count and count from last 7 days.
-    Cross-group: no chat_id filter.
+    Aggregate stats for matching listings/queries (total and last-7-days
+    count; cross-group, no chat_id filter) plus the message text of the
+    newest `limit` matching rows, on one connection. Returns (stats, rows);
+    rows is empty when nothing matches or limit is 0.
     """
+    where, params = _match_filter(category, listing_type, subcategory, property_type, gender_preference)
     conn = get_connection()
-    cursor = conn.cursor()
-
-    # Base query — NO chat_id filter for cross-group
-    query = """
-        SELECT COUNT(*) as total FROM listings
-        WHERE category = ?
-        AND listing_type = ?
-        AND expires_at > ?
-    """
-    params = [category, listing_type, datetime.now()]
-
-    # Filters
-    if subcategory:
-        query += " AND (subcategory LIKE ? OR message LIKE ?)"
-        params.extend([f"%{subcategory}%", f"%{subcategory}%"])
-    if property_type:
-        query += " AND property_type = ?"
-        params.append(property_type)
-    if gender_preference:
-        query += " AND gender_preference = ?"
-        params.append(gender_preference)
-
-    cursor.execute(query, params)
-    total = cursor.fetchone()["total"]
-
-    # Count from last 7 days
-    recent_query = query + " AND created_at > ?"
-    recent_params = params + [datetime.now() - timedelta(days=7)]
-    cursor.execute(recent_query, recent_params)
-    recent = cursor.fetchone()["total"]
-
+    stats = _query_match_stats(conn, where, params)
+    rows = []
+    if stats["total"] and limit:
+        # The hook only reads the text (prices, preferences) — skip the rest
+        rows = [dict(row) for row in conn.execute(
+            f"SELECT message FROM listings {where} ORDER BY created_at DESC LIMIT ?",
+            params + [limit]
+        )]
     conn.close()
-    return {"total": total, "recent_7d": recent}
+    return stats, rows
 
 
 def get_stats() -> dict:
     """Get statistics about listings."""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("""
+    cursor = conn.execute("""
         SELECT category, COUNT(*) as count 
         FROM listings 
         WHERE expires_at > ?
@@ -551,9 +793,8 @@ def get_stats() -> dict:
     
     by_category = {row['category']: row['count'] for row in cursor.fetchall()}
     
-    cursor.execute("SELECT COUNT(*) as total FROM listings WHERE expires_at > ?", 
-                   (datetime.now(),))
-    total = cursor.fetchone()['total']
+    total = conn.execute("SELECT COUNT(*) as total FROM listings WHERE expires_at > ?",
+                         (datetime.now(),)).fetchone()['total']
     
     conn.close()
     
@@ -563,12 +804,64 @@ def get_stats() -> dict:
 def cleanup_expired():
     """Remove expired listings."""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM listings WHERE expires_at < ?", (datetime.now(),))
-    deleted = cursor.rowcount
+    deleted = conn.execute("DELETE FROM listings WHERE expires_at < ?", (datetime.now(),)).rowcount
+    conn.execute("""
+        DELETE FROM lead_request_matches
+        WHERE listing_id NOT IN (SELECT id FROM listings)
+    """)
     
     conn.commit()
+    # Refresh planner statistics after the bulk delete (cheap; only
+    # re-analyzes tables whose stats are stale)
+    conn.execute("PRAGMA optimize")
     conn.close()
     
     return deleted
+
+
+# ─── Classification Cache ─────────────────────────────────────
+
+
+def get_cached_classification(text_hash: str, max_age_seconds: int) -> Optional[tuple]:
+    """(result_json, ts) stored for a message hash, or None if missing or too old."""
+    cutoff = int(datetime.now().timestamp()) - max_age_seconds
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT result, ts FROM classify_cache WHERE text_hash = ? AND ts >= ?", (text_hash, cutoff)
+    ).fetchone()
+    conn.close()
+    return (row["result"], row["ts"]) if row else None
+
+
+def save_classifications(entries: list):
+    """Store (text_hash, result_json) pairs in one transaction."""
+    if not entries:
+        return
+    ts = int(datetime.now().timestamp())
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO classify_cache (text_hash, result, ts) VALUES (?, ?, ?)",
+            [(text_hash, result, ts) for text_hash, result in entries]
+        )
+    conn.close()
+
+
+def prune_classify_cache(max_age_seconds: int) -> int:
+    """Delete cached classifications older than max_age_seconds. Returns rows removed."""
+    cutoff = int(datetime.now().timestamp()) - max_age_seconds
+    conn = get_connection()
+    with conn:
+        deleted = conn.execute("DELETE FROM classify_cache WHERE ts < ?", (cutoff,)).rowcount
+    conn.close()
+    return deleted
+
+
+def clear_classify_cache() -> int:
+    """Delete every cached classification. Returns rows removed."""
+    conn = get_connection()
+    with conn:
+        deleted = conn.execute("DELETE FROM classify_cache").rowcount
+    conn.close()
+    return deleted
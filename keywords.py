@@ -1,4 +1,4 @@
-"""Category emoji definitions for display purposes."""
+"""Category emoji definitions and listing vocabulary."""
 
 # Category emoji map (used for /stats display)
 CATEGORY_EMOJIS = {
@@ -17,3 +17,46 @@ CATEGORY_EMOJIS = {
     "painter": "🎨",
     "security_guard": "👮",
 }
+
+# Words that show up in real offers/searches (English + common Hinglish).
+# A message with none of these and no phone number is treated as chat and
+# never sent to the LLM (see classifier.MessageClassifier._should_ignore).
+# Keep this broad: a missing word here means a listing is silently dropped.
+CATEGORY_KEYWORDS = {
+    "property": [
+        "bhk", "rk", "flat", "apartment", "villa", "house", "home", "room",
+        "roommate", "flatmate", "pg", "tenant", "owner", "broker", "deposit",
+        "furnished", "unfurnished", "property", "plot", "shop", "office",
+        "ghar", "kamra", "makaan", "kiraya", "kiraye", "kirayedar",
+    ],
+    "furniture": [
+        "furniture", "sofa", "bed", "table", "chair", "fridge", "refrigerator",
+        "tv", "almirah", "wardrobe", "mattress", "dining", "cupboard",
+        "washing machine", "microwave", "cooler", "geyser", "ro",
+    ],
+    "maid": [
+        "maid", "cook", "nanny", "babysitter", "house help", "househelp",
+        "domestic", "cleaning", "bai", "kaamwali", "khana",
+    ],
+    "plumber": ["plumber", "plumbing", "leak", "leakage", "tap", "pipe", "drainage"],
+    "electrician": ["electrician", "electrical", "wiring", "fan", "switch", "inverter", "mcb"],
+    "carpenter": ["carpenter", "woodwork", "door", "cabinet", "modular"],
+    "driver": ["driver", "chauffeur"],
+    "ac_repair": ["ac", "appliance", "repair", "servicing", "service"],
+    "tutor": ["tutor", "tuition", "teacher", "coaching", "classes", "class"],
+    "packers_movers": ["packers", "movers", "shifting", "relocation", "tempo"],
+    "vehicle": ["car", "bike", "scooter", "scooty", "activa", "vehicle", "cycle"],
+    "pest_control": ["pest", "cockroach", "termite", "bedbug", "rats"],
+    "painter": ["painter", "painting", "paint", "putty"],
+    "security_guard": ["security", "guard", "watchman"],
+}
+
+# Offer/search intent words, independent of category
+INTENT_KEYWORDS = [
+    "need", "needed", "require", "required", "requirement", "looking",
+    "search", "searching", "want", "wanted", "available", "sell", "selling",
+    "sale", "buy", "buying", "rent", "rental", "renting", "lease", "urgent",
+    "urgently", "contact", "call", "dm", "whatsapp", "price", "rs", "lakh",
+    "lakhs", "lac", "per month", "negotiable", "anyone", "koi", "chahiye",
+    "chaiye", "chahie", "bechna", "bechni", "becha", "milega", "mil jayega",
+]
@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 
 # Try to import Groq
 try:
+    import httpx
     from groq import Groq
     GROQ_AVAILABLE = True
 except ImportError:
@@ -28,7 +29,7 @@ CATEGORIES = [
     "vehicle", "pest_control", "painter", "security_guard"
 ]
 
-CLASSIFICATION_PROMPT = """You are a message classifier for a housing society group chat.
+CLASSIFICATION_RULES = """You are a message classifier for a housing society group chat.
 Classify ONLY if the message is an ACTUAL listing offer or a genuine search request.
 
 IMPORTANT: IGNORE these types of messages (classify as "ignore"):
@@ -58,7 +59,9 @@ Categories (only if ACTUAL offer/query):
 - painter: painting, wall paint
 - security_guard: watchman, security
 - ignore: ANYTHING that is NOT an actual offer or search request
+"""
 
+CLASSIFICATION_PROMPT = CLASSIFICATION_RULES + """
 Message: "{message}"
 
 Respond in EXACTLY this format:
@@ -68,6 +71,7 @@ SUBCATEGORY: <specific item like "2bhk", "roommate" etc or "none">
 PROPERTY_TYPE: <"sale" if buying/selling, "rent" if renting, or "none">
 GENDER_PREFERENCE: <"male" or "female" if specified, or "none">
 CONTACT: <phone number if found, or "none">
+SUMMARY: <5-10 word summary: item, price, location; no phone numbers or names>
 
 For general chat/status updates/discussions, respond:
 CATEGORY: ignore
@@ -76,8 +80,32 @@ SUBCATEGORY: none
 PROPERTY_TYPE: none
 GENDER_PREFERENCE: none
 CONTACT: none
+SUMMARY: none
+"""
+
+BATCH_CLASSIFICATION_PROMPT = CLASSIFICATION_RULES + """
+Messages:
+{messages}
+
+For EACH message, in order, write a line "MESSAGE <number>" followed by EXACTLY this format:
+CATEGORY: <category>
+TYPE: <offer or query>
+SUBCATEGORY: <specific item like "2bhk", "roommate" etc or "none">
+PROPERTY_TYPE: <"sale" if buying/selling, "rent" if renting, or "none">
+GENDER_PREFERENCE: <"male" or "female" if specified, or "none">
+CONTACT: <phone number if found, or "none">
+SUMMARY: <5-10 word summary: item, price, location; no phone numbers or names>
+
+For general chat/status updates/discussions, use CATEGORY: ignore and "none" for the other fields.
 """
 
+# Indian mobile number, compiled once. First branch: 10 digits starting 6-9,
+# optionally separated by space/dash. Second: +91, 91 or 0 prefixed form.
+_PHONE_RE = re.compile(
+    r'\b[6-9](?:\d[-\s]?){9}\b'
+    r'|(?:\+91|91|0)[-\s]?[6-9](?:\d[-\s]?){9}\b'
+)
+
 SUMMARIZE_PROMPT = """Summarize this listing in 5-10 words.
 Only include key details (item, price, location). 
 Exclude phone numbers, names, and contact requests.
@@ -88,21 +116,56 @@ Listing: "{message}"
 Summary:"""
 
 
+class ClassificationError(Exception):
+    """
+    The LLM gave no verdict (API error, no client, unparseable reply).
+    Unlike an "ignore" verdict (None), this must not be cached.
+    """
+
+
+def fallback_summary(message: str) -> str:
+    """Stand-in for an LLM summary: the message, cut to 100 chars."""
+    if len(message) > 100:
+        return message[:97] + "..."
+    return message
+
+
+class SummarizationError(Exception):
+    """summarize_description(..., fallback=False) got no summary from the LLM."""
+
+
+# Placeholder for a message missing from a batch reply
+_MISSING = object()
+
 
 class LLMClassifier:
     def __init__(self):
         self.client = None
         if GROQ_AVAILABLE and GROQ_API_KEY:
             try:
-                self.client = Groq(api_key=GROQ_API_KEY)
+                # Group messages arrive seconds to minutes apart; httpx's 5s
+                # default keep-alive would mean a fresh TLS handshake per call
+                http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=8,
+                                        keepalive_expiry=60)
+                )
+                self.client = Groq(api_key=GROQ_API_KEY, http_client=http_client)
                 logger.info("Groq LLM classifier initialized")
             except Exception as e:
                 logger.error(f"Failed to init Groq: {e}")
     
+    def close(self):
+        """Close the pooled HTTP connections (call on shutdown)."""
+        if self.client:
+            self.client.close()
+    
     def classify(self, text: str) -> Optional[dict]:
-        """Classify message using LLM."""
+        """
+        Classify message using LLM. Returns None for messages to ignore;
+        raises ClassificationError if there is no verdict.
+        """
         if not self.client:
-            return None
+            raise ClassificationError("Groq client not configured")
         
         try:
             response = self.client.chat.completions.create(
@@ -111,26 +174,86 @@ class LLMClassifier:
                     {"role": "user", "content": CLASSIFICATION_PROMPT.format(message=text)}
                 ],
                 temperature=0.1,
-                max_tokens=100
+                max_tokens=130
             )
             
             result = response.choices[0].message.content.strip()
-            return self._parse_response(result)
-            
         except Exception as e:
             logger.error(f"LLM classification failed: {e}")
-            return None
+            raise ClassificationError(str(e)) from e
+        
+        return self._parse_response(result)
+    
+    def classify_batch(self, texts: list) -> list:
+        """
+        Classify several messages with a single LLM call.
+        Returns one result (dict or None) per text, in input order; raises
+        ClassificationError if the call fails.
+        """
+        if len(texts) <= 1:
+            return [self.classify(text) for text in texts]
+        
+        if not self.client:
+            raise ClassificationError("Groq client not configured")
+        
+        numbered = "\n".join(f'{i}. "{text}"' for i, text in enumerate(texts, 1))
+        
+        try:
+            response = self.client.chat.completions.create(
+                model="llama-3.1-8b-instant",
+                messages=[
+                    {"role": "user", "content": BATCH_CLASSIFICATION_PROMPT.format(messages=numbered)}
+                ],
+                temperature=0.1,
+                max_tokens=130 * len(texts)
+            )
+            
+            result = response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"LLM batch classification failed: {e}")
+            raise ClassificationError(str(e)) from e
+        
+        results = self._parse_batch_response(result, len(texts))
+        # A block the reply left out (or mangled) is not an "ignore" verdict;
+        # ask again for just that message
+        return [
+            self.classify(text) if result is _MISSING else result
+            for text, result in zip(texts, results)
+        ]
+    
+    def _parse_batch_response(self, response: str, count: int) -> list:
+        """
+        Split a numbered batch reply into per-message results; messages
+        without a block in the reply are _MISSING.
+        """
+        results = [_MISSING] * count
+        # re.split with a capture group yields [preamble, num, block, num, block, ...].
+        # Tolerates markdown around the header ("**MESSAGE 1**", "### Message 1:")
+        parts = re.split(r'^[\s*#_]*MESSAGE\s+(\d+)[\s*#_:.]*$', response, flags=re.MULTILINE | re.IGNORECASE)
+        for num, block in zip(parts[1::2], parts[2::2]):
+            index = int(num) - 1
+            if 0 <= index < count and 'CATEGORY' in block.upper():
+                results[index] = self._parse_response(block)
+        return results
     
     def _parse_response(self, response: str) -> Optional[dict]:
         """Parse LLM response into structured dict."""
         try:
             lines = response.strip().split('\n')
             data = {}
+            summary = None
             
             for line in lines:
                 if ':' in line:
                     key, value = line.split(':', 1)
-                    data[key.strip().upper()] = value.strip().lower()
+                    key = key.strip().upper()
+                    data[key] = value.strip().lower()
+                    if key == 'SUMMARY':
+                        # Shown to users as-is, so keep the original casing
+                        summary = value.strip().strip('"')
+            
+            if summary and summary.lower() == 'none':
+                summary = None
             
             category = data.get('CATEGORY', 'ignore')
             
@@ -174,38 +297,32 @@ class LLMClassifier:
                 "listing_type": listing_type,
                 "contact": contact if contact != 'none' else None,
                 "property_type": property_type,
-                "gender_preference": gender_preference
+                "gender_preference": gender_preference,
+                "short_detail": summary or None
             }
             
         except Exception as e:
             logger.error(f"Failed to parse LLM response: {e}")
-            return None
+            raise ClassificationError(f"Unparseable LLM response: {e}") from e
     
     def _extract_phone(self, text: str) -> Optional[str]:
         """Extract phone number from text."""
-        patterns = [
-            # 10 digits start with 6-9, optionally separated by space/dash
-            r'\b[6-9](?:\d[-\s]?){9}\b',
-            # +91 or 91 or 0 followed by 10 digits (with separators)
-            r'(?:\+91|91|0)[-\s]?[6-9](?:\d[-\s]?){9}\b'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                params = re.sub(r'\D', '', match.group())
-                if len(params) > 10:
-                    return params[-10:]
-                return params
-        return None
+        match = _PHONE_RE.search(text)
+        if not match:
+            return None
+        # Keep last 10 digits (drops +91/91/0 prefix and separators)
+        return re.sub(r'\D', '', match.group())[-10:]
     
-    def summarize_description(self, message: str) -> str:
-        """Summarize a listing description using LLM."""
+    def summarize_description(self, message: str, fallback: bool = True) -> str:
+        """
+        Summarize a listing description using LLM. If that fails, returns the
+        truncated message — or, with fallback=False, raises SummarizationError
+        (for callers that cache summaries and shouldn't cache the fallback).
+        """
         if not self.client:
-            # Fallback: just return first 100 chars
-            if len(message) > 100:
-                return message[:97] + "..."
-            return message
+            if not fallback:
+                raise SummarizationError("Groq client not configured")
+            return fallback_summary(message)
         
         try:
             response = self.client.chat.completions.create(
@@ -225,10 +342,9 @@ class LLMClassifier:
             
         except Exception as e:
             logger.error(f"LLM summarization failed: {e}")
-            # Fallback
-            if len(message) > 100:
-                return message[:97] + "..."
-            return message
+            if not fallback:
+                raise SummarizationError(str(e)) from e
+            return fallback_summary(message)
 
 
 # Create global instance
@@ -3,9 +3,11 @@ Query matcher with in-Telegram lead delivery.
 Shows compelling hook in group → deep link to DM → free leads → paid upsell.
 """
 
+import re
+import functools
 from datetime import datetime
 from typing import Optional
-from database import get_matching_listings, get_matching_queries, get_match_stats
+from database import get_match_stats_and_sample
 from config import MAX_RESULTS, FREE_LEADS_COUNT, TIER1_PRICE, TIER1_LEADS, TIER2_PRICE, TIER2_LEADS
 
 
@@ -46,6 +48,19 @@ def get_gender_label(gender: Optional[str]) -> Optional[str]:
     return None
 
 
+def md_entity_text(text: str, delimiter: str) -> str:
+    """
+    Make user/LLM text safe inside a legacy-Markdown entity (*bold*, _italic_).
+    Only the entity's own delimiter ends it early, and legacy Markdown has no
+    escaping inside entities, so that one character is dropped ('_' becomes a
+    space). Otherwise Telegram rejects the whole message.
+    """
+    return text.replace(delimiter, " " if delimiter == "_" else "")
+
+
+# The label space is small (category x subcategory x type x gender) and the
+# same label is built for the group reply, the free preview and the delivery
+@functools.lru_cache(maxsize=2048)
 def build_label(category: str, subcategory: Optional[str], property_type: Optional[str], gender_preference: Optional[str]) -> str:
     """Build a human-readable label like '2bhk for rent' or 'female roommate'."""
     parts = []
@@ -63,23 +78,49 @@ def build_label(category: str, subcategory: Optional[str], property_type: Option
     if prop_label:
         parts.append(prop_label)
 
-    return " ".join(parts)
+    # Always shown inside *bold*
+    return md_entity_text(" ".join(parts), "*")
+
+
+@functools.lru_cache(maxsize=10000)
+def _summarize_cached(message: str) -> str:
+    # Raises instead of returning the truncated fallback, so a failed
+    # call isn't cached for the life of the process
+    from llm_classifier import llm_classifier
+    return llm_classifier.summarize_description(message, fallback=False)
 
 
 def _extract_short_detail(message: str) -> str:
     """Summarize listing message into 5-10 words using LLM."""
-    from llm_classifier import llm_classifier
-    return llm_classifier.summarize_description(message)
+    from llm_classifier import SummarizationError, fallback_summary
+    # The same listing is shown on every lead request that matches it;
+    # collapse whitespace so reposts with different spacing share a summary
+    message = " ".join(message.split())
+    try:
+        return _summarize_cached(message)
+    except SummarizationError:
+        return fallback_summary(message)
+
+
+def _listing_detail(listing: dict) -> str:
+    """Short description for a lead card: stored summary, else summarize now."""
+    # Listings classified after the summary was folded into the
+    # classification prompt already carry one — no extra LLM call
+    return listing.get("short_detail") or _extract_short_detail(listing.get("message", ""))
+
+
+# Match patterns like 17k, 17000, 17,000, 25k etc.
+_PRICE_RE = re.compile(r'(\d{1,3})[,]?(\d{3})\b|\b(\d{1,2})[kK]\b')
+_FAMILY_RE = re.compile(r'famil(?:y|ies)', re.IGNORECASE)
+_BACHELOR_RE = re.compile(r'bachelor|single', re.IGNORECASE)
 
 
 def _extract_rent_prices(listings: list) -> Optional[int]:
     """Try to extract average rent/price from listing messages."""
-    import re
     prices = []
     for listing in listings:
         msg = listing.get("message", "")
-        # Match patterns like 17k, 17000, 17,000, 25k etc.
-        matches = re.findall(r'(\d{1,3})[,]?(\d{3})\b|\b(\d{1,2})[kK]\b', msg)
+        matches = _PRICE_RE.findall(msg)
         for m in matches:
             if m[0] and m[1]:
                 # Full number like 17000 or 17,000
@@ -101,14 +142,13 @@ def _extract_rent_prices(listings: list) -> Optional[int]:
 
 def _detect_preference(listings: list) -> Optional[str]:
     """Detect common preferences from listings (family/bachelor etc)."""
-    import re
     family_count = 0
     bachelor_count = 0
     for listing in listings:
-        msg = listing.get("message", "").lower()
-        if re.search(r'family|families', msg):
+        msg = listing.get("message", "")
+        if _FAMILY_RE.search(msg):
             family_count += 1
-        if re.search(r'bachelor|bachelors|single', msg):
+        if _BACHELOR_RE.search(msg):
             bachelor_count += 1
     
     if family_count > bachelor_count and family_count > 0:
@@ -290,9 +330,9 @@ def format_free_leads(listings: list, label: str) -> str:
     for i, listing in enumerate(listings, 1):
         username = listing.get("username")
         first_name = listing.get("first_name") or "Someone"
-        name_str = f"@{username}" if username else first_name
+        name_str = md_entity_text(f"@{username}" if username else first_name, "*")
         
-        desc = _extract_short_detail(listing.get("message", ""))
+        desc = md_entity_text(_listing_detail(listing), "_")
         contact = listing.get("contact")
         
         contact_line = f" · 📞 {contact}" if contact else ""
@@ -302,6 +342,15 @@ def format_free_leads(listings: list, label: str) -> str:
     return "\n".join(lines)
 
 
+# Static tail of the upsell message, joined once
+_UPSELL_FOOTER = "\n".join([
+    "\n✅ Verified contacts with phone numbers",
+    "✅ Direct connection — no middleman",
+    "✅ Updated this week",
+    "\n👇 *Unlock now — contacts delivered in seconds:*",
+])
+
+
 def format_upsell_message(total_available: int, category: str = "property") -> str:
     """Format the upsell message — category-aware pitch."""
     remaining = max(0, total_available - FREE_LEADS_COUNT)
@@ -311,19 +360,23 @@ def format_upsell_message(total_available: int, category: str = "property") -> s
         "━━━━━━━━━━━━━━━━━━━━━━━━━━━━",
         f"\n🔥 *{remaining} more people are waiting to connect!*",
         f"\n_{ctx['upsell_hook']} for just ₹{TIER1_PRICE}!_",
-        f"\n✅ Verified contacts with phone numbers",
-        f"✅ Direct connection — no middleman",
-        f"✅ Updated this week",
-        f"\n👇 *Unlock now — contacts delivered in seconds:*",
+        _UPSELL_FOOTER,
     ]
     
     return "\n".join(lines)
 
 
-def format_paid_leads(listings: list, label: str, include_tips: bool = False, category: str = "property") -> str:
-    """Format paid contact cards — category-aware tips."""
+# Paid leads per Telegram message: each card may need an LLM summary, so the
+# user gets the first batch without waiting for the whole tier
+PAID_LEADS_PER_MESSAGE = 5
+
+
+def iter_paid_leads(listings: list, label: str, include_tips: bool = False,
+                    category: str = "property", chunk_size: int = PAID_LEADS_PER_MESSAGE):
+    """Yield paid contact cards as message texts of up to chunk_size leads each."""
     if not listings:
-        return "😔 No additional contacts found. You have not been charged."
+        yield "😔 No additional contacts found. You have not been charged."
+        return
     
     ctx = _get_category_context(category)
     
@@ -335,14 +388,18 @@ def format_paid_leads(listings: list, label: str, include_tips: bool = False, ca
     for i, listing in enumerate(listings, 1):
         username = listing.get("username")
         first_name = listing.get("first_name") or "Someone"
-        name_str = f"@{username}" if username else first_name
+        name_str = md_entity_text(f"@{username}" if username else first_name, "*")
         
-        desc = _extract_short_detail(listing.get("message", ""))
+        desc = md_entity_text(_listing_detail(listing), "_")
         contact = listing.get("contact")
         
         contact_line = f" · 📞 {contact}" if contact else ""
         lines.append(f"{i}. *{name_str}*{contact_line}")
         lines.append(f"   _{desc}_")
+        
+        if i % chunk_size == 0 and i < len(listings):
+            yield "\n".join(lines)
+            lines = []
     
     if include_tips:
         lines.append(f"\n🧠 *{ctx['tips_title']}:*\n")
@@ -351,7 +408,13 @@ def format_paid_leads(listings: list, label: str, include_tips: bool = False, ca
     
     lines.append("\n💙 _Thanks for using Society Ka Bot! Search again anytime._")
     
-    return "\n".join(lines)
+    yield "\n".join(lines)
+
+
+def format_paid_leads(listings: list, label: str, include_tips: bool = False, category: str = "property") -> str:
+    """Format paid contact cards — category-aware tips."""
+    return next(iter_paid_leads(listings, label, include_tips, category,
+                                chunk_size=max(len(listings), 1)))
 
 
 # ─── Main Match Functions ─────────────────────────────────────
@@ -369,27 +432,19 @@ def find_matches(
     Find matching listings for a query.
     Returns hook-style response text. Button is added by bot.py.
     """
-    # Get aggregate stats (cross-group)
-    stats = get_match_stats(
+    # Aggregate stats (cross-group) and a sample for detail extraction
+    stats, sample_listings = get_match_stats_and_sample(
         category=category,
         listing_type="offer",
         subcategory=subcategory,
         property_type=property_type,
-        gender_preference=gender_preference
+        gender_preference=gender_preference,
+        limit=10
     )
 
     if stats["total"] == 0:
         return None
 
-    # Get a sample of listings for detail extraction
-    sample_listings = get_matching_listings(
-        category=category,
-        subcategory=subcategory,
-        property_type=property_type,
-        gender_preference=gender_preference,
-        limit=10
-    )
-
     return format_hook_response_for_query(
         stats=stats,
         category=category,
@@ -412,27 +467,19 @@ def find_interested_buyers(
     Find people looking for something in this category.
     Returns hook-style response text. Button is added by bot.py.
     """
-    # Get aggregate stats (cross-group)
-    stats = get_match_stats(
+    # Aggregate stats (cross-group); the offer hook doesn't use a sample
+    stats, sample_queries = get_match_stats_and_sample(
         category=category,
         listing_type="query",
         subcategory=subcategory,
         property_type=property_type,
-        gender_preference=gender_preference
+        gender_preference=gender_preference,
+        limit=0
     )
 
     if stats["total"] == 0:
         return None
 
-    # Get a sample for detail extraction
-    sample_queries = get_matching_queries(
-        category=category,
-        subcategory=subcategory,
-        property_type=property_type,
-        gender_preference=gender_preference,
-        limit=10
-    )
-
     return format_hook_response_for_offer(
         stats=stats,
         category=category,
@@ -1,10 +1,10 @@
 """Test script to verify the classifier and matcher with sample messages."""
 
 import sys
-import io
 
 # Fix Windows console encoding
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+# Block-buffered: output is flushed in a few large writes instead of per line
+sys.stdout.reconfigure(encoding='utf-8', errors='replace', line_buffering=False)
 
 from classifier import classifier
 from database import init_db, add_listing, save_lead_request, get_lead_request, get_leads_for_request